@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+# pygame is an optional extra, without it only the step benchmarks run
+pygame = pytest.importorskip("pygame")
+
+from universe_game.managers.graphics import GraphicsRenderer
+from universe_game.managers.particle import ParticleManager
+
+PARTICLE_COUNTS = [500, 1000, 5000, 20000]
+DENSITY_PARTICLE_COUNTS = [100_000, 1_000_000]
+WINDOW_SIZE = (800, 800)
+CIRCLE_RADIUS = 5
+
+
+@pytest.fixture(scope="module", autouse=True)
+def pygame_display():
+    pygame.init()
+    yield
+    pygame.quit()
+
+
+def make_renderer(n_particles, **kwargs):
+    pm = ParticleManager(n_particles, velocity=0.01, radius=2, box_width=5, seed=0)
+    return GraphicsRenderer(pm, box_width=5, **kwargs), pm.particle_pos
+
+
+@pytest.mark.parametrize("n_particles", PARTICLE_COUNTS)
+def bench_transform(measure, n_particles):
+    renderer, positions = make_renderer(n_particles)
+    velocities = np.zeros((n_particles, 2))
+    measure(
+        lambda: renderer._transform_frame(positions, velocities, WINDOW_SIZE), 50
+    )
+
+
+@pytest.mark.parametrize("n_particles", PARTICLE_COUNTS)
+def bench_draw(measure, n_particles):
+    renderer, positions = make_renderer(n_particles)
+    surface = pygame.Surface(WINDOW_SIZE, pygame.SRCALPHA)
+    coords = renderer._transform_frame(positions, None, WINDOW_SIZE)
+
+    def draw():
+        surface.fill((0, 0, 0, 0))
+        renderer._stamp_frame(surface, coords, CIRCLE_RADIUS)
+
+    measure(draw, 20)
+
+
+@pytest.mark.parametrize("n_particles", DENSITY_PARTICLE_COUNTS)
+def bench_draw_density(measure, n_particles):
+    renderer, positions = make_renderer(n_particles, density_threshold=0)
+    surface = pygame.Surface(WINDOW_SIZE, pygame.SRCALPHA)
+
+    def draw():
+        surface.fill((0, 0, 0, 0))
+        renderer._draw_frame(surface, positions, None, WINDOW_SIZE, CIRCLE_RADIUS)
+
+    measure(draw, 5)
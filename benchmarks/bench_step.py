@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from interesting_conds import conds
+from universe_game.managers.particle import ParticleManager
+from universe_game.numba_kernels import NUMBA_AVAILABLE
+
+PARTICLE_COUNTS = [500, 1000, 5000, 20000]
+ENGINES = ["dense", "grid", "verlet"] + (["numba"] if NUMBA_AVAILABLE else [])
+# The dense N x N workspace no longer fits in memory comfortably above this
+MAX_DENSE_PARTICLES = 5000
+# Presets where most particles see the whole cloud every step
+GLOBAL_PRESETS = [
+    name
+    for name, preset in conds.items()
+    if preset.get("chance_for_global_radius", 0.1) > 0.5
+]
+
+
+def rounds_for(n_particles):
+    return max(3, 20000 // n_particles)
+
+
+@pytest.mark.parametrize("n_particles", PARTICLE_COUNTS)
+@pytest.mark.parametrize("engine", ENGINES)
+def bench_step_scaling(measure, engine, n_particles):
+    """Local neighbourhoods at the particle density of the swarm preset."""
+    if engine == "dense" and n_particles > MAX_DENSE_PARTICLES:
+        pytest.skip("the dense engine needs N x N buffers")
+    pm = ParticleManager(
+        n_particles,
+        velocity=0.01,
+        radius=2,
+        chance_for_global_radius=0.0,
+        box_width=5 * np.sqrt(n_particles / 1000),
+        neighbor_engine=engine,
+        seed=0,
+    )
+    measure(pm._update_particle_positions, rounds_for(n_particles))
+
+
+@pytest.mark.parametrize("preset", list(conds))
+@pytest.mark.parametrize("engine", ENGINES)
+def bench_step_preset(measure, benchmark, engine, preset):
+    pm = ParticleManager(**conds[preset], neighbor_engine=engine, seed=0)
+    # Let the presets develop their structure before timing
+    pm.run(20, record_every=0)
+    benchmark.extra_info["global_radius"] = preset in GLOBAL_PRESETS
+    measure(pm._update_particle_positions, rounds_for(pm.n_particles))
@@ -0,0 +1,35 @@
+"""
+pytest-benchmark suite timing the hot loop of the simulation and the pygame
+drawing path, recording the peak traced memory of each case in extra_info.
+
+Save a baseline, then compare later runs against it and fail on regressions:
+    pytest benchmarks --benchmark-save=baseline
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:15%
+The results are stored as JSON in benchmarks/.results.
+"""
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def measure(benchmark):
+    """
+    Benchmark `function` for `rounds` rounds after one warm-up call, storing
+    the peak memory traced during the warm-up in the benchmark's extra_info.
+    """
+
+    def run(function, rounds):
+        tracemalloc.start()
+        function()
+        benchmark.extra_info["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return benchmark.pedantic(function, rounds=rounds, iterations=1)
+
+    return run
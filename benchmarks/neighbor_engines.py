@@ -0,0 +1,79 @@
+"""
+Compare the time per step of the neighbour engines as the number of particles grows.
+In the "local" scenario the particle density is kept constant so that the grid
+engine sees a fixed number of neighbours per particle. The "global" scenario
+mirrors the stable_ring_collapse preset, where every particle sees the whole cloud.
+
+Usage: python benchmarks/neighbor_engines.py [local|global] [max_dense_particles]
+Peak traced memory of a single step is reported next to the time. That the
+engines agree with "dense" is checked by tests/test_neighbor_engines.py.
+"""
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+sys.path.append(".")
+
+from universe_game.managers.particle import ParticleManager
+from universe_game.numba_kernels import NUMBA_AVAILABLE
+
+PARTICLE_COUNTS = [500, 1000, 2000, 5000, 10000, 20000, 50000]
+ENGINES = ["dense", "tiled", "grid", "verlet", "domains"]
+ENGINES += ["numba"] if NUMBA_AVAILABLE else []
+STEPS = 5
+
+
+def make_conds(n_particles, scenario="local"):
+    if scenario == "global":
+        return {
+            "n_particles": n_particles,
+            "velocity": 1,
+            "radius": 4,
+            "chance_for_global_radius": 1,
+            "beta": 0.2,
+            "box_width": 1400,
+            "initial_range": 1,
+            "clip_boundary": True,
+        }
+    return {
+        "n_particles": n_particles,
+        "velocity": 0.01,
+        "radius": 2,
+        "chance_for_global_radius": 0.0,
+        "beta": 1,
+        "box_width": 5 * np.sqrt(n_particles / 1000),
+        "clip_boundary": True,
+    }
+
+
+def time_engine(engine, n_particles, scenario="local", seed=0):
+    conds = make_conds(n_particles, scenario)
+    pm = ParticleManager(**conds, neighbor_engine=engine, seed=seed)
+    tracemalloc.start()
+    pm._update_particle_positions()  # warm-up
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = perf_counter()
+    for _ in range(STEPS):
+        pm._update_particle_positions()
+    step_time = (perf_counter() - start) / STEPS
+    pm.close()
+    return step_time, peak_memory
+
+
+if __name__ == "__main__":
+    scenario = sys.argv[1] if len(sys.argv) > 1 else "local"
+    max_dense = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    header = "".join(f"{engine + ' [ms]':>14}{'[MB]':>8}" for engine in ENGINES)
+    print(f"{'N':>8}{header}")
+    for n_particles in PARTICLE_COUNTS:
+        row = f"{n_particles:>8}"
+        for engine in ENGINES:
+            if engine in ("dense", "tiled") and n_particles > max_dense:
+                row += f"{'-':>14}{'-':>8}"
+                continue
+            step_time, peak_memory = time_engine(engine, n_particles, scenario)
+            row += f"{step_time * 1e3:14.2f}{peak_memory / 2**20:8.1f}"
+        print(row)
@@ -0,0 +1,72 @@
+"""
+Compare the per-frame drawing cost of the pygame renderer against the original
+per-particle draw.circle loop. Runs under the dummy SDL video driver, so no
+window is needed.
+
+Usage: python benchmarks/pygame_render.py
+"""
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.append(".")
+
+import pygame
+
+from universe_game.managers.graphics import GraphicsRenderer
+from universe_game.managers.particle import ParticleManager
+
+PARTICLE_COUNTS = [1000, 10000, 50000]
+WINDOW_SIZE = (800, 800)
+CIRCLE_RADIUS = 5
+FRAMES = 10
+
+
+def draw_per_particle(surface, positions, velocities, offset, scale):
+    """The drawing loop as it was before vectorisation."""
+    for idx, particle in enumerate(positions):
+        x, y, _ = particle
+        vel_x, vel_y = velocities[idx]
+        x += vel_x
+        y += vel_y
+        scaled_x = (x + offset) * scale
+        scaled_y = (y + offset) * scale
+        pygame.draw.circle(surface, (0, 0, 0), (scaled_x, scaled_y), CIRCLE_RADIUS)
+
+
+def time_frames(draw):
+    start = perf_counter()
+    for _ in range(FRAMES):
+        draw()
+    return (perf_counter() - start) / FRAMES
+
+
+if __name__ == "__main__":
+    pygame.init()
+    surface = pygame.Surface(WINDOW_SIZE, pygame.SRCALPHA)
+    print(f"{'N':>8}{'loop [ms]':>12}{'sprites [ms]':>14}{'speedup':>9}")
+    for n_particles in PARTICLE_COUNTS:
+        pm = ParticleManager(
+            n_particles, velocity=0.01, radius=2, box_width=5, seed=0
+        )
+        renderer = GraphicsRenderer(pm, box_width=5)
+        velocities = np.zeros((n_particles, 2))
+        scale = WINDOW_SIZE[0] / 5
+        loop_time = time_frames(
+            lambda: draw_per_particle(
+                surface, pm.particle_pos, velocities.tolist(), 0, scale
+            )
+        )
+        sprite_time = time_frames(
+            lambda: renderer._draw_frame(
+                surface, pm.particle_pos, velocities, WINDOW_SIZE, CIRCLE_RADIUS
+            )
+        )
+        print(
+            f"{n_particles:>8}{loop_time * 1e3:12.2f}{sprite_time * 1e3:14.2f}"
+            f"{loop_time / sprite_time:8.1f}x"
+        )
+    pygame.quit()
@@ -0,0 +1,54 @@
+"""
+Measure the heap memory allocated by a steady-state step with tracemalloc.
+The dense engine writes every intermediate into the preallocated workspace of
+the ParticleManager, so after the first step it should allocate next to
+nothing, whereas an N x N temporary alone takes 8 * N^2 bytes.
+
+Usage: python benchmarks/step_allocations.py [engine]
+"""
+import sys
+import tracemalloc
+from time import perf_counter
+
+sys.path.append(".")
+
+from universe_game.managers.particle import ParticleManager
+
+PARTICLE_COUNTS = [500, 1000, 2000, 5000]
+STEPS = 5
+
+
+def measure_step(n_particles, engine="dense"):
+    pm = ParticleManager(
+        n_particles,
+        velocity=0.01,
+        radius=2,
+        chance_for_global_radius=0.1,
+        box_width=5,
+        neighbor_engine=engine,
+        seed=0,
+    )
+    pm._update_particle_positions()  # warm-up, allocates the workspace
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = perf_counter()
+    for _ in range(STEPS):
+        pm._update_particle_positions()
+    step_time = (perf_counter() - start) / STEPS
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return step_time, peak - baseline, current - baseline
+
+
+if __name__ == "__main__":
+    engine = sys.argv[1] if len(sys.argv) > 1 else "dense"
+    print(
+        f"{'N':>8}{'step [ms]':>12}{'peak alloc [kB]':>17}"
+        f"{'retained [kB]':>15}{'N x N [kB]':>13}"
+    )
+    for n_particles in PARTICLE_COUNTS:
+        step_time, peak, retained = measure_step(n_particles, engine)
+        print(
+            f"{n_particles:>8}{step_time * 1e3:12.2f}{peak / 1e3:17.1f}"
+            f"{retained / 1e3:15.1f}{8 * n_particles**2 / 1e3:13.0f}"
+        )
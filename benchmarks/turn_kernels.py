@@ -0,0 +1,46 @@
+"""
+Time the bearing and cross-product turn kernels. Their parity, including the
+pairs on the heading line where rounding can separate them, is checked by
+tests/test_turn_kernels.py.
+
+Usage: python benchmarks/turn_kernels.py
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.append(".")
+
+from universe_game.neighbors import dense_turn_counts, prepare_headings
+
+PARTICLE_COUNTS = [500, 1000, 2000, 5000]
+KERNELS = [("bearing", "float64"), ("cross", "float64"), ("cross", "float32")]
+
+
+def turn_counts(x, y, angles, radius_sq, kernel, dtype, tile_size=256):
+    headings = prepare_headings(angles, kernel, dtype)
+    return dense_turn_counts(
+        x.astype(dtype),
+        y.astype(dtype),
+        headings,
+        radius_sq.astype(dtype),
+        np.arange(len(x)),
+        tile_size=tile_size,
+    )
+
+
+if __name__ == "__main__":
+    header = "".join(f"{f'{kernel}/{dtype} [ms]':>22}" for kernel, dtype in KERNELS)
+    print(f"{'N':>8}{header}")
+    rng = np.random.default_rng(2)
+    for n_particles in PARTICLE_COUNTS:
+        x, y = rng.random(n_particles) * 5, rng.random(n_particles) * 5
+        angles = rng.random(n_particles) * 360
+        radius_sq = np.full(n_particles, 4.0)
+        row = f"{n_particles:>8}"
+        for kernel, dtype in KERNELS:
+            start = perf_counter()
+            turn_counts(x, y, angles, radius_sq, kernel, dtype)
+            row += f"{(perf_counter() - start) * 1e3:22.2f}"
+        print(row)
@@ -0,0 +1,64 @@
+"""
+Render presets or recorded trajectories offline to GIF or video files.
+
+Usage: python export.py <preset or .traj file> ... [--steps 1000] [--frame-skip 3]
+           [--size 400] [--fps 20] [--format gif] [--out-dir .] [--seed 0]
+           [--workers N]
+
+For example, `python export.py galaxy onion swarm --frame-skip 3 --out-dir gifs`
+simulates the three presets headless, one per core, and writes
+gifs/galaxy.gif, gifs/onion.gif and gifs/swarm.gif. A single source is
+rasterised by all the workers instead.
+"""
+import argparse
+import os
+import sys
+
+from interesting_conds import conds
+from universe_game.export import export_many, export_video
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Render presets or trajectories offline to GIF or video."
+    )
+    parser.add_argument("sources", nargs="+", help="preset names or .traj files")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument(
+        "--frame-skip", type=int, default=1, help="keep every Nth step or frame"
+    )
+    parser.add_argument("--size", type=int, default=400, help="width and height")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--format", choices=["gif", "mp4", "avi"], default="gif")
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(args)
+
+    jobs = []
+    for source in args.sources:
+        name = os.path.splitext(os.path.basename(source))[0]
+        if source not in conds and not os.path.exists(source):
+            parser.error(f"{source} is neither a preset nor a trajectory file")
+        jobs.append(
+            {
+                "source": conds[source] if source in conds else source,
+                "filename": os.path.join(args.out_dir, f"{name}.{args.format}"),
+                "steps": args.steps,
+                "frame_skip": args.frame_skip,
+                "size": (args.size, args.size),
+                "fps": args.fps,
+                "seed": args.seed,
+            }
+        )
+    os.makedirs(args.out_dir, exist_ok=True)
+    if len(jobs) == 1:
+        filenames = [export_video(**jobs[0], n_workers=args.workers)]
+    else:
+        filenames = export_many(jobs, n_workers=args.workers)
+    for filename in filenames:
+        print(filename)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
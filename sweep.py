@@ -0,0 +1,91 @@
+"""
+Sweep the initial conditions of a preset headless and summarise every run.
+
+Usage: python sweep.py <condition> [key=value1,value2,...] ... [--steps 1000]
+           [--seeds 1] [--record-every 10] [--workers N] [--csv results.csv]
+
+For example, `python sweep.py shedding_ring beta=0.1,0.2,0.4 radius=2,4` runs the
+six combinations on top of the shedding_ring preset. Finished runs are cached in
+.sweep_cache, so extending a sweep only computes the new points.
+"""
+import argparse
+import ast
+import csv
+import sys
+
+from interesting_conds import conds
+from universe_game.sweep import SWEEP_CACHE_DIR, expand_grid, run_sweep
+
+METRICS = ["clusters", "ring_radius", "ring_spread", "centroid_speed"]
+
+
+def parse_grid(assignments):
+    """Parse ["beta=0.1,0.2", ...] into {"beta": [0.1, 0.2], ...}."""
+    grid = {}
+    for assignment in assignments:
+        key, _, values = assignment.partition("=")
+        if not values:
+            raise ValueError(f"Expected key=value1,value2,... got {assignment!r}")
+        grid[key] = [parse_value(value) for value in values.split(",")]
+    return grid
+
+
+def parse_value(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def format_cell(value):
+    if isinstance(value, float):
+        return f"{value:>16.4g}"
+    return f"{value!s:>16}"
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Sweep the initial conditions of a preset."
+    )
+    parser.add_argument("condition", choices=list(conds))
+    parser.add_argument("grid", nargs="*", help="key=value1,value2,...")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument(
+        "--seeds", type=int, default=1, help="number of seeds per point"
+    )
+    parser.add_argument("--record-every", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=SWEEP_CACHE_DIR)
+    parser.add_argument(
+        "--csv", default=None, help="also write the results to a CSV file"
+    )
+    args = parser.parse_args(args)
+
+    grid = parse_grid(args.grid)
+    results = run_sweep(
+        expand_grid(conds[args.condition], grid),
+        args.steps,
+        seeds=range(args.seeds),
+        record_every=args.record_every,
+        n_workers=args.workers,
+        cache_dir=args.cache,
+    )
+    columns = list(grid) + ["seed"] + METRICS
+    rows = [
+        [result["conds"][key] for key in grid]
+        + [result["seed"]]
+        + [result["metrics"][metric] for metric in METRICS]
+        for result in results
+    ]
+    print("".join(f"{column:>16}" for column in columns))
+    for row in rows:
+        print("".join(format_cell(value) for value in row))
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
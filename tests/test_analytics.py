@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from interesting_conds import conds
+from universe_game.analytics import METRICS, NEIGHBOR_HISTOGRAM_BINS
+from universe_game.managers.particle import ParticleManager
+
+
+def run_with_analytics(steps=1, **kwargs):
+    pm = ParticleManager(
+        **{**dict(conds["swarm"], n_particles=300), **kwargs},
+        seed=0,
+        analytics=True,
+        analytics_every=1,
+    )
+    pm.run(steps)
+    return pm
+
+
+def test_polarization_of_aligned_headings():
+    # The hexagonal lattice heads every particle along x, and nothing turns them
+    pm = run_with_analytics(
+        distribution="hexagonal", alpha=0, beta=0, clip_boundary=False
+    )
+    assert pm.analytics.latest("polarization") == 1.0
+
+
+def test_polarization_of_opposite_headings():
+    pm = run_with_analytics()
+    pm.angles[:] = np.tile([0.0, 180.0], pm.n_particles // 2)
+    assert METRICS["polarization"](pm) == pytest.approx(0.0, abs=1e-12)
+
+
+def test_neighbor_histogram_spans_the_particle_count():
+    # Every particle of the swarm sees tens to hundreds of neighbours, which
+    # bins of width 1 would all put in the last bin
+    pm = run_with_analytics()
+    histogram = pm.analytics.latest("neighbor_histogram")
+    edges = pm.analytics.edges["neighbor_histogram"]
+    assert histogram.sum() == pm.n_particles
+    np.testing.assert_array_equal(
+        edges, np.linspace(0, pm.n_particles, NEIGHBOR_HISTOGRAM_BINS + 1)
+    )
+    expected, _ = np.histogram(pm.workspace["neighbor_count"], edges)
+    np.testing.assert_array_equal(histogram, expected)
+    assert np.count_nonzero(histogram) > 1
+
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from interesting_conds import conds
+from universe_game.managers.ensemble import EnsembleParticleManager
+from universe_game.managers.particle import ParticleManager
+from universe_game.rng import spawn_seeds
+
+N_PARTICLES = 80
+STEPS = 30
+
+
+def test_members_follow_their_own_trajectories():
+    conds_list = [
+        dict(conds[preset], n_particles=N_PARTICLES, neighbor_engine=engine)
+        for preset, engine in [("swarm", "dense"), ("petri_dish", "grid")]
+    ]
+    snapshots = EnsembleParticleManager(conds_list, seed=0).run(STEPS, STEPS)
+    for member_conds, member_seed, member in zip(
+        conds_list, spawn_seeds(0, len(conds_list)), snapshots[-1]
+    ):
+        pm = ParticleManager(**member_conds, seed=member_seed)
+        assert np.array_equal(pm.run(STEPS, STEPS)[-1], member)
+
+
+@pytest.mark.parametrize(
+    "setting",
+    [{"turn_kernel": "cross"}, {"state_dtype": "float32"}, {"kernel_dtype": "float32"}],
+)
+def test_unsupported_settings_are_rejected(setting):
+    conds_list = [dict(conds["swarm"], n_particles=N_PARTICLES, **setting)]
+    with pytest.raises(ValueError, match=next(iter(setting))):
+        EnsembleParticleManager(conds_list, seed=0)
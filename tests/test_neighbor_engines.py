@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from interesting_conds import conds
+from universe_game.managers.particle import ParticleManager
+
+N_PARTICLES = 120
+STEPS = 5
+ENGINES = [
+    ("tiled", {"tile_size": 32}),
+    ("grid", {}),
+    ("verlet", {}),
+    ("domains", {"n_domains": 2}),
+    ("numba", {}),
+]
+
+
+def run(preset, state_dtype, neighbor_engine="dense", **kwargs):
+    pm = ParticleManager(
+        **dict(conds[preset], n_particles=N_PARTICLES),
+        seed=0,
+        state_dtype=state_dtype,
+        neighbor_engine=neighbor_engine,
+        **kwargs,
+    )
+    try:
+        return pm.run(STEPS)
+    finally:
+        pm.close()
+
+
+@pytest.mark.parametrize("state_dtype", ["float64", "float32"])
+@pytest.mark.parametrize("preset", sorted(conds))
+@pytest.mark.parametrize("engine, options", ENGINES, ids=[e for e, _ in ENGINES])
+def test_engine_matches_dense(engine, options, preset, state_dtype):
+    if engine == "numba":
+        pytest.importorskip("numba")
+    expected = run(preset, state_dtype)
+    actual = run(preset, state_dtype, engine, **options)
+    assert np.array_equal(expected, actual)
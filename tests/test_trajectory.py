@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from interesting_conds import conds
+from universe_game.managers.controller import GameController
+from universe_game.managers.particle import ParticleManager
+
+
+def swarm(**kwargs):
+    return dict(conds["swarm"], n_particles=50, seed=0, **kwargs)
+
+
+@pytest.mark.parametrize("record_every", [0, -1])
+def test_stream_rejects_record_every_below_one(record_every):
+    with pytest.raises(ValueError, match="record_every"):
+        next(ParticleManager(**swarm()).stream(5, record_every))
+
+
+def test_run_without_snapshots():
+    assert ParticleManager(**swarm()).run(5, record_every=0).shape == (0, 50, 3)
+
+
+def test_trajectory_rejects_record_every_below_one(tmp_path):
+    filename = str(tmp_path / "run.traj")
+    with pytest.raises(ValueError, match="record_every"):
+        GameController(**swarm()).run(5, record_every=0, trajectory=filename)
+    assert not os.path.exists(filename)
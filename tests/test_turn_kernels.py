@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from universe_game.neighbors import (
+    TURN_KERNELS,
+    classify_pairs,
+    dense_turn_counts,
+    prepare_headings,
+)
+
+LATTICE_HEADINGS = np.arange(8) * 45.0
+# Pairs closer than this to the heading line, relative to their distance, may be
+# classified differently by the two kernels because of rounding
+COLLINEAR_TOLERANCE = 1e-12
+
+
+def lattice(side, spacing=1.0, offset=0.0):
+    grid = np.arange(side) * spacing + offset
+    x, y = (coords.ravel() for coords in np.meshgrid(grid, grid))
+    return x, y
+
+
+def turn_counts(x, y, angles, radius_sq, kernel):
+    return dense_turn_counts(
+        x, y, prepare_headings(angles, kernel), radius_sq, np.arange(len(x))
+    )
+
+
+@pytest.mark.parametrize("kernel", TURN_KERNELS)
+def test_exactly_collinear_pairs(kernel):
+    # Particle 0 heads along +x: in the kernels' convention particle 2 lies at a
+    # relative bearing of exactly 0 and particle 1 at exactly -180 degrees
+    x, y = np.array([0.0, 1.0, -1.0]), np.zeros(3)
+    angles, radius_sq = np.zeros(3), np.full(3, 4.0)
+    left, right = turn_counts(x[[0, 2]], y[[0, 2]], angles[:2], radius_sq[:2], kernel)
+    assert (left[0], right[0]) == (0, 0)
+    left, right = turn_counts(x, y, angles, radius_sq, kernel)
+    assert (left[0], right[0]) == (1, 0)
+
+
+@pytest.mark.parametrize("heading", [*LATTICE_HEADINGS, None])
+def test_integer_lattice_parity(heading):
+    # Exact coordinates: every relative bearing of 0 or -180 is exact in both kernels
+    x, y = lattice(20)
+    rng = np.random.default_rng(0)
+    if heading is None:
+        angles = rng.choice(LATTICE_HEADINGS, len(x))
+    else:
+        angles = np.full(len(x), heading)
+    radius_sq = np.full(len(x), 9.0)
+    expected = turn_counts(x, y, angles, radius_sq, "bearing")
+    actual = turn_counts(x, y, angles, radius_sq, "cross")
+    np.testing.assert_array_equal(expected, actual)
+
+
+@pytest.mark.parametrize("radius_sq", [20.0**2, 20.0 * 1000**2])
+def test_non_integer_lattice_only_differs_on_collinear_pairs(radius_sq):
+    # The rounded coordinates put many pairs within rounding of the heading line
+    x, y = lattice(40, spacing=7.3, offset=5.0)
+    angles = np.random.default_rng(0).choice(LATTICE_HEADINGS, len(x))
+    dx = x[:, np.newaxis] - x
+    dy = y[:, np.newaxis] - y
+    distances_sq = dx**2 + dy**2
+    radius_sq = np.full((len(x), 1), radius_sq)
+    bearing_masks = classify_pairs(
+        dx, dy, distances_sq, radius_sq, angles[:, np.newaxis]
+    )
+    cos_vals, sin_vals = prepare_headings(angles, "cross")
+    cos_vals, sin_vals = cos_vals[:, np.newaxis], sin_vals[:, np.newaxis]
+    cross_masks = classify_pairs(dx, dy, distances_sq, radius_sq, (cos_vals, sin_vals))
+    differs = (bearing_masks[0] != cross_masks[0]) | (
+        bearing_masks[1] != cross_masks[1]
+    )
+    cross = np.abs(cos_vals * dy - sin_vals * dx)
+    tolerance = COLLINEAR_TOLERANCE * np.sqrt(distances_sq[differs])
+    assert np.all(cross[differs] <= tolerance)
+
+
+@pytest.mark.parametrize("kernel", TURN_KERNELS)
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("radius_sq", [20.0**2, 20.0 * 1000**2])
+def test_numba_kernel_parity(kernel, dtype, radius_sq):
+    pytest.importorskip("numba")
+    from universe_game.numba_kernels import fused_turn_counts
+
+    # Near-collinear pairs included, the fused kernel rounds like the dense one
+    x, y = (coords.astype(dtype) for coords in lattice(40, spacing=7.3, offset=5.0))
+    angles = np.random.default_rng(0).choice(LATTICE_HEADINGS, len(x))
+    headings = prepare_headings(angles, kernel, dtype)
+    radius_sq = np.full(len(x), radius_sq, dtype=dtype)
+    expected = dense_turn_counts(x, y, headings, radius_sq, np.arange(len(x)))
+    actual = fused_turn_counts(x, y, headings, radius_sq)
+    np.testing.assert_array_equal(expected, actual)
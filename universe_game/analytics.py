@@ -0,0 +1,178 @@
+import json
+
+import numpy as np
+
+from universe_game.metrics import (
+    centroid,
+    count_clusters,
+    polarization,
+    radius_of_gyration,
+)
+from universe_game.optional import require
+
+# Number of most recent evaluations kept per metric
+ANALYTICS_CAPACITY = 1000
+# Equal-width bins of the neighbour histogram, spanning 0 to n_particles
+NEIGHBOR_HISTOGRAM_BINS = 32
+
+# Step metrics, {name: metric(particle_manager)}, see register_metric
+METRICS = {}
+# Bin edges of the histogram metrics, {name: edges(particle_manager)}
+METRIC_EDGES = {}
+
+
+def register_metric(name, edges=None):
+    """
+    Decorator registering metric(particle_manager) as a step metric. It is
+    called right after a step and returns a scalar or a fixed-shape array.
+    A histogram metric passes `edges(particle_manager)` returning its bin
+    edges, which StepAnalytics keeps next to the values.
+    """
+
+    def decorator(metric):
+        METRICS[name] = metric
+        if edges is not None:
+            METRIC_EDGES[name] = edges
+        return metric
+
+    return decorator
+
+
+@register_metric("polarization")
+def _polarization(pm):
+    # The headings in the workspace predate the turn, so use the current angles
+    angles = np.radians(pm.angles)
+    return polarization(np.cos(angles), np.sin(angles))
+
+
+@register_metric("centroid")
+def _centroid(pm):
+    return centroid(pm.particle_pos)
+
+
+@register_metric("radius_of_gyration")
+def _radius_of_gyration(pm):
+    return radius_of_gyration(pm.particle_pos)
+
+
+def _neighbor_histogram_edges(pm):
+    return np.linspace(0, pm.n_particles, NEIGHBOR_HISTOGRAM_BINS + 1)
+
+
+@register_metric("neighbor_histogram", edges=_neighbor_histogram_edges)
+def _neighbor_histogram(pm):
+    # Left plus right neighbours, as summed by _turns_from_counters, binned
+    # relative to n_particles so dense and global presets are resolved too
+    bins = pm.workspace["neighbor_count"] * NEIGHBOR_HISTOGRAM_BINS // pm.n_particles
+    return np.bincount(bins, minlength=NEIGHBOR_HISTOGRAM_BINS)
+
+
+@register_metric("clusters")
+def _clusters(pm):
+    return count_clusters(pm.particle_pos, pm.radius)
+
+
+class StepAnalytics:
+    """
+    Evaluate the named step metrics every `every` steps into ring buffers
+    holding the last `capacity` values of each. The metrics read the state and
+    the neighbour counts the step left behind, so only the cluster count
+    searches for neighbours again.
+    """
+
+    enabled = True
+
+    def __init__(self, metrics=None, every=10, capacity=ANALYTICS_CAPACITY):
+        self.metrics = list(METRICS) if metrics is None else list(metrics)
+        unknown = [name for name in self.metrics if name not in METRICS]
+        if unknown:
+            raise ValueError(
+                f"Unknown metrics {unknown}, expected some of {list(METRICS)}"
+            )
+        self.every = every
+        self.capacity = capacity
+        self.step = 0
+        self.count = 0
+        self.steps = np.zeros(capacity, dtype=np.int64)
+        # Allocated on the first evaluation, once the shape of each metric is known
+        self.values = {}
+        # Bin edges of the histogram metrics, see register_metric
+        self.edges = {}
+
+    def update(self, pm):
+        """Count a step of the ParticleManager, evaluating the metrics every `every` steps."""
+        self.step += 1
+        if self.step % self.every:
+            return
+        slot = self.count % self.capacity
+        self.steps[slot] = self.step
+        for name in self.metrics:
+            value = np.asarray(METRICS[name](pm))
+            if name not in self.values:
+                self.values[name] = np.zeros(
+                    (self.capacity,) + value.shape, dtype=value.dtype
+                )
+                if name in METRIC_EDGES:
+                    self.edges[name] = METRIC_EDGES[name](pm)
+            self.values[name][slot] = value
+        self.count += 1
+
+    def _order(self):
+        """Slots of the ring buffers from the oldest to the newest value."""
+        if self.count <= self.capacity:
+            return np.arange(self.count)
+        return (np.arange(self.capacity) + self.count) % self.capacity
+
+    def latest(self, name):
+        """The most recent value of the metric."""
+        if self.count == 0:
+            raise LookupError("No step has been evaluated yet.")
+        return self.values[name][(self.count - 1) % self.capacity]
+
+    def history(self, name=None):
+        """
+        Return the evaluated steps and the values of the metric, oldest first,
+        or a {name: values} dict of every metric if `name` is None.
+        """
+        order = self._order()
+        if name is not None:
+            return self.steps[order], self.values[name][order]
+        return self.steps[order], {
+            metric: values[order] for metric, values in self.values.items()
+        }
+
+    def export(self, filename):
+        """
+        Write the history to a .npz file with a `step` array, one array per
+        metric and a `<name>_edges` array per histogram, or to a .parquet table
+        with one column per metric and the edges in the schema metadata (needs
+        pyarrow).
+        """
+        steps, history = self.history()
+        edges = {f"{name}_edges": values for name, values in self.edges.items()}
+        if not filename.endswith(".parquet"):
+            np.savez(filename, step=steps, **history, **edges)
+            return
+        pa = require("pyarrow")
+        parquet = require("pyarrow.parquet")
+        columns = {"step": pa.array(steps)}
+        for name, values in history.items():
+            if values.ndim == 1:
+                columns[name] = pa.array(values)
+            else:
+                # Vector metrics become fixed-size list columns
+                flat = pa.array(values.reshape(len(values), -1).ravel())
+                columns[name] = pa.FixedSizeListArray.from_arrays(
+                    flat, int(np.prod(values.shape[1:]))
+                )
+        metadata = {name: json.dumps(values.tolist()) for name, values in edges.items()}
+        parquet.write_table(pa.table(columns, metadata=metadata), filename)
+
+
+class NullAnalytics:
+    """Stand-in used when analytics are off."""
+
+    enabled = False
+
+    def update(self, pm):
+        pass
@@ -1,34 +1,136 @@
 import numpy as np
 
+# Initial distributions, {name: generator(pm, state, rng, **params)}, see
+# register_distribution
+DISTRIBUTIONS = {}
+
+
+def register_distribution(name):
+    """
+    Decorator registering generator(pm, state, rng, **params) as an initial
+    distribution. It fills the (3, n_particles) x, y and heading rows of
+    `state` in place, drawing from the Generator `rng`. The parameters come
+    from the distribution_params of the ParticleManager `pm`.
+    """
+
+    def decorator(generator):
+        DISTRIBUTIONS[name] = generator
+        return generator
+
+    return decorator
+
 
 def hexagonal_lattice(n_particles, radius):
     """Return the positions of particles in a uniform hexagonal lattice."""
     vertical_spacing = radius * np.sqrt(3) / 2
-    horizontal_spacing = radius
+    # Rows span [0, sqrt(n_particles)], every other one shifted by radius / 2
+    width = np.sqrt(n_particles)
+    n_even = int(np.floor(width / radius)) + 1
+    n_odd = max(int(np.floor((width - radius / 2) / radius)) + 1, 0)
+    index = np.arange(n_particles)
+    row_pair, column = np.divmod(index, n_even + n_odd)
+    odd = column >= n_even
+    column[odd] -= n_even
+    positions = np.zeros((n_particles, 3))
+    positions[:, 0] = column * radius + odd * (radius / 2)
+    positions[:, 1] = (2 * row_pair + odd) * vertical_spacing
+    return positions
+
+
+def _random_headings(state, rng):
+    headings = rng.random(out=state[2], dtype=state.dtype)
+    headings *= 360
+
+
+def _place_polar(state, center, radii, angles):
+    """Set x, y to center + radii * (cos, sin)(angles), where radii may alias x and angles y."""
+    x, y = state[0], state[1]
+    cos_angles = np.cos(angles)
+    np.sin(angles, out=y)
+    y *= radii
+    np.multiply(radii, cos_angles, out=x)
+    x += center[0]
+    y += center[1]
+
+
+def _center(pm, center):
+    if center is None:
+        return pm.box_width / 2, pm.box_width / 2
+    return center
+
+
+@register_distribution("uniform")
+def uniform(pm, state, rng):
+    """Uniform in the square of side initial_range centred in the box."""
+    # Drawn as (n_particles, 3) rows, so seeded runs keep their initial state
+    positions = rng.random((pm.n_particles, 3))
+    box_center = pm.box_width / 2
+    positions[:, 0:2] *= pm.initial_range
+    positions[:, 0:2] -= pm.initial_range / 2
+    positions[:, 0:2] += box_center
+    positions[:, 2] *= 360
+    state[:] = positions.T
+
+
+@register_distribution("hexagonal")
+def hexagonal(pm, state, rng, spacing=None):
+    """A hexagonal lattice with `spacing` (default radius), all heading along x."""
+    positions = hexagonal_lattice(pm.n_particles, spacing or pm.radius)
+    state[:] = positions.T
+    pm.box_width = np.max(positions[:, 0:2])
 
-    # A list to store positions
-    positions = []
 
-    row_num = 0
-    particle_count = 0
+@register_distribution("gaussian")
+def gaussian(pm, state, rng, std=None, center=None):
+    """A gaussian blob with standard deviation `std` (default initial_range / 4)."""
+    std = pm.initial_range / 4 if std is None else std
+    center = _center(pm, center)
+    xy = rng.standard_normal(out=state[:2], dtype=state.dtype)
+    xy *= std
+    xy += np.reshape(center, (2, 1))
+    _random_headings(state, rng)
 
-    while particle_count < n_particles:
-        # Calculate y position based on row number
-        y = row_num * vertical_spacing
 
-        # Adjust the starting x position for every other row
-        if row_num % 2 == 0:
-            x_start = 0
-        else:
-            x_start = radius / 2
+@register_distribution("disk")
+def disk(pm, state, rng, radius=None, center=None):
+    """Uniform in a disk of `radius` (default initial_range / 2)."""
+    radius = pm.initial_range / 2 if radius is None else radius
+    radii, angles = rng.random(out=state[:2], dtype=state.dtype)
+    # The square root spreads the particles evenly over the area
+    np.sqrt(radii, out=radii)
+    radii *= radius
+    angles *= 2 * np.pi
+    _place_polar(state, _center(pm, center), radii, angles)
+    _random_headings(state, rng)
 
-        x = x_start
 
-        while x <= np.sqrt(n_particles) and particle_count < n_particles:
-            positions.append([x, y, 0])
-            x += horizontal_spacing
-            particle_count += 1
+@register_distribution("ring")
+def ring(pm, state, rng, radius=None, width=0.0, center=None):
+    """Uniform in an annulus of mean `radius` (default initial_range / 2) and `width`."""
+    radius = pm.initial_range / 2 if radius is None else radius
+    radii, angles = rng.random(out=state[:2], dtype=state.dtype)
+    radii -= 0.5
+    radii *= width
+    radii += radius
+    angles *= 2 * np.pi
+    _place_polar(state, _center(pm, center), radii, angles)
+    _random_headings(state, rng)
 
-        row_num += 1
 
-    return np.array(positions)
+@register_distribution("clustered")
+def clustered(pm, state, rng, n_clusters=5, std=None, center=None):
+    """
+    A mixture of `n_clusters` equally likely gaussian blobs with standard
+    deviation `std` (default initial_range / 20), centred uniformly in the
+    square of side initial_range.
+    """
+    std = pm.initial_range / 20 if std is None else std
+    centers = rng.random((2, n_clusters))
+    centers -= 0.5
+    centers *= pm.initial_range
+    centers += np.reshape(_center(pm, center), (2, 1))
+    labels = rng.integers(n_clusters, size=pm.n_particles)
+    xy = rng.standard_normal(out=state[:2], dtype=state.dtype)
+    xy *= std
+    xy += centers[:, labels]
+    _random_headings(state, rng)
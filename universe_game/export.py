@@ -0,0 +1,201 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from universe_game.managers.graphics import DENSITY_THRESHOLD
+from universe_game.managers.particle import ParticleManager
+from universe_game.optional import require
+from universe_game.pygame_utils import (
+    compute_dynamic_scale_and_offset,
+    density_levels,
+    lerp,
+)
+from universe_game.recording import FrameRecorder
+from universe_game.trajectory import TrajectoryReader, record_trajectory
+
+# Frames rasterised per task of the process pool
+EXPORT_CHUNK_FRAMES = 16
+# Smoothing of the viewport per displayed frame, as in GraphicsRenderer
+VIEWPORT_SMOOTHING = 0.05
+
+
+def frame_viewports(frames, size, box_width, clip_boundary=True, frame_skip=1):
+    """
+    Return the (scale_x, scale_y, offset_x, offset_y) of every frame, following
+    the cloud like GraphicsRenderer does when clip_boundary is False. Each
+    viewport depends on the previous one, so they are found before rendering.
+    """
+    viewports = np.empty((len(frames), 4))
+    viewport = np.array([size[0] / box_width, size[1] / box_width, 0.0, 0.0])
+    if clip_boundary:
+        viewports[:] = viewport
+        return viewports
+    # Catch up as much in one exported frame as in frame_skip displayed ones
+    smoothing = 1 - (1 - VIEWPORT_SMOOTHING) ** frame_skip
+    for index, positions in enumerate(frames):
+        target = compute_dynamic_scale_and_offset(positions, size, padding=0.2)
+        viewport = lerp(viewport, np.array(target), smoothing)
+        viewports[index] = viewport
+    return viewports
+
+
+def rasterize(positions, viewport, size, circle_radius=2, density=False):
+    """
+    Draw the particles in black on white into a (height, width) uint8 image,
+    as discs of `circle_radius` pixels, or as a density image if `density`.
+    """
+    scale_x, scale_y, offset_x, offset_y = viewport
+    coords = (positions[:, :2] + (offset_x, offset_y)) * (scale_x, scale_y)
+    levels = density_levels(coords, size).T
+    if not density:
+        levels = _dilate(levels > 0, circle_radius).view(np.uint8) * np.uint8(255)
+    return 255 - levels
+
+
+def _dilate(mask, radius):
+    """Grow every set pixel of the mask into a disc of `radius` pixels."""
+    height, width = mask.shape
+    grown = np.zeros_like(mask)
+    for dy, dx in _disc_offsets(radius):
+        grown[max(dy, 0) : height + min(dy, 0), max(dx, 0) : width + min(dx, 0)] |= (
+            mask[max(-dy, 0) : height + min(-dy, 0), max(-dx, 0) : width + min(-dx, 0)]
+        )
+    return grown
+
+
+@lru_cache(maxsize=8)
+def _disc_offsets(radius):
+    offsets = np.arange(-radius, radius + 1)
+    dy, dx = np.meshgrid(offsets, offsets, indexing="ij")
+    inside = dy**2 + dx**2 <= radius**2
+    return list(zip(dy[inside].tolist(), dx[inside].tolist()))
+
+
+@lru_cache(maxsize=1)
+def _open_trajectory(filename):
+    # Each worker maps the trajectory once and reuses it for all its chunks
+    return TrajectoryReader(filename)
+
+
+def _render_chunk(filename, indices, viewports, size, circle_radius, density):
+    trajectory = _open_trajectory(filename)
+    return np.stack(
+        [
+            rasterize(trajectory[index], viewport, size, circle_radius, density)
+            for index, viewport in zip(indices, viewports)
+        ]
+    )
+
+
+def render_frames(trajectory, size, frame_skip=1, circle_radius=None, n_workers=None):
+    """
+    Yield every `frame_skip`-th frame of the trajectory, rasterised at `size`,
+    in order. The frames are rendered in chunks by a pool of `n_workers`
+    processes, or in this process if n_workers is 0.
+    """
+    if isinstance(trajectory, str):
+        trajectory = TrajectoryReader(trajectory)
+    conds = trajectory.conds or {}
+    indices = np.arange(0, len(trajectory), frame_skip)
+    viewports = frame_viewports(
+        [trajectory[index] for index in indices],
+        size,
+        conds.get("box_width", 5),
+        clip_boundary=conds.get("clip_boundary", True),
+        frame_skip=frame_skip * trajectory.record_every,
+    )
+    if circle_radius is None:
+        # The live renderer draws 5 pixel circles in an 800 pixel window
+        circle_radius = max(1, round(5 * size[0] / 800))
+    density = trajectory.n_particles >= DENSITY_THRESHOLD
+    chunks = [
+        (
+            trajectory.filename,
+            indices[start : start + EXPORT_CHUNK_FRAMES],
+            viewports[start : start + EXPORT_CHUNK_FRAMES],
+            size,
+            circle_radius,
+            density,
+        )
+        for start in range(0, len(indices), EXPORT_CHUNK_FRAMES)
+    ]
+    if n_workers == 0:
+        for chunk in chunks:
+            yield from _render_chunk(*chunk)
+        return
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for frames in executor.map(_render_chunk, *zip(*chunks)):
+            yield from frames
+
+
+def write_frames(frames, filename, size, fps=30):
+    """
+    Write the grey frames to a .gif with a 256 grey palette, which stores them
+    exactly, or to a video through FrameRecorder.
+    """
+    if filename.endswith(".gif"):
+        image = require("PIL.Image")
+        images = (image.fromarray(frame) for frame in frames)
+        first = next(images)
+        first.save(
+            filename,
+            save_all=True,
+            append_images=images,
+            duration=round(1000 / fps),
+            loop=0,
+        )
+        return
+    with FrameRecorder(filename, size, fps) as recorder:
+        for frame in frames:
+            recorder.write(np.broadcast_to(frame[..., np.newaxis], frame.shape + (3,)))
+
+
+def export_video(
+    source,
+    filename,
+    steps=1000,
+    frame_skip=1,
+    size=(400, 400),
+    fps=30,
+    seed=None,
+    circle_radius=None,
+    n_workers=None,
+):
+    """
+    Render a run offline to filename (.gif or a video), without a display.
+    `source` is a TrajectoryReader or the filename of one, or a conds dict,
+    which is first run headless for `steps` steps into a temporary trajectory,
+    keeping every `frame_skip`-th step. No real-time frame cap applies.
+    """
+    if not isinstance(source, dict):
+        frames = render_frames(source, size, frame_skip, circle_radius, n_workers)
+        write_frames(frames, filename, size, fps)
+        return filename
+    conds = source if seed is None else {**source, "seed": seed}
+    with tempfile.TemporaryDirectory() as directory:
+        trajectory = record_trajectory(
+            ParticleManager(**conds),
+            os.path.join(directory, "run.traj"),
+            steps,
+            record_every=frame_skip,
+            conds=conds,
+        )
+        frames = render_frames(trajectory, size, 1, circle_radius, n_workers)
+        write_frames(frames, filename, size, fps)
+    return filename
+
+
+def export_many(jobs, n_workers=None):
+    """
+    Run export_video(**job) for every job dict, one job per worker process,
+    so exporting several runs scales with the number of cores. Returns the
+    filenames in order.
+    """
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(export_video, **{**job, "n_workers": 0}) for job in jobs
+        ]
+        return [future.result() for future in futures]
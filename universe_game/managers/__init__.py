@@ -1,3 +1,13 @@
 from .controller import GameController
-from .graphics import GraphicsRenderer
-from .particle import ParticleManager
\ No newline at end of file
+from .ensemble import EnsembleParticleManager, run_ensemble
+from .particle import ParticleManager
+from .pipeline import SimulationWorker
+
+
+def __getattr__(name):
+    # Importing the renderer pulls in pygame and matplotlib, so only do it on demand
+    if name == "GraphicsRenderer":
+        from .graphics import GraphicsRenderer
+
+        return GraphicsRenderer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,42 @@
 from .particle import ParticleManager
-from .graphics import GraphicsRenderer
+from universe_game.optional import require
+from universe_game.trajectory import record_trajectory
+
+# Display modes of GameController.start, {mode: (start, required modules)}
+BACKENDS = {}
+
+
+def register_backend(mode, requires=()):
+    """
+    Decorator registering start(controller, **kwargs) as the display mode `mode`.
+    The modules in `requires` are imported only when the mode is started.
+    """
+
+    def decorator(start):
+        BACKENDS[mode] = (start, tuple(requires))
+        return start
+
+    return decorator
+
+
+@register_backend("pygame", requires=("pygame",))
+def _start_pygame(controller, **kwargs):
+    return controller.renderer.start_pygame(**kwargs)
+
+
+@register_backend("matplotlib", requires=("matplotlib",))
+def _start_matplotlib(controller, **kwargs):
+    return controller.renderer.start_matplotlib(**kwargs)
+
+
+@register_backend("replay", requires=("pygame",))
+def _start_replay(controller, **kwargs):
+    return controller.renderer.start_replay(**kwargs)
+
+
+@register_backend("headless")
+def _start_headless(controller, **kwargs):
+    return controller.run(**kwargs)
 
 
 class GameController:
@@ -7,10 +44,44 @@ class GameController:
 
     def __init__(self, **kwargs):
         self.pm = ParticleManager(**kwargs)
-        self.renderer = GraphicsRenderer(self.pm, **kwargs)
+        self.kwargs = kwargs
+        self._renderer = None
+
+    @property
+    def renderer(self):
+        """The renderer is only created (and pygame/matplotlib imported) when needed."""
+        if self._renderer is None:
+            from .graphics import GraphicsRenderer
+
+            self._renderer = GraphicsRenderer(self.pm, **self.kwargs)
+        return self._renderer
 
     def start(self, mode="pygame", **kwargs):
-        if mode == "pygame":
-            self.renderer.start_pygame(**kwargs)
-        elif mode == "matplotlib":
-            self.renderer.start_matplotlib(**kwargs)
+        """Start the display mode `mode`, one of BACKENDS, see register_backend."""
+        if mode not in BACKENDS:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {list(BACKENDS)}.")
+        start, requires = BACKENDS[mode]
+        for module in requires:
+            require(module)
+        try:
+            return start(self, **kwargs)
+        finally:
+            self._export_profile()
+
+    def _export_profile(self):
+        """Write the phase timings to `profile_output` when profiling is enabled."""
+        profile_output = self.kwargs.get("profile_output", None)
+        if profile_output is not None and self.pm.profiler.enabled:
+            self.pm.profiler.export(profile_output)
+
+    def run(self, steps, record_every=1, trajectory=None):
+        """
+        Run the simulation as fast as possible without rendering, see ParticleManager.run.
+        If a trajectory filename is given the snapshots are written to disk instead,
+        and a memory-mapped TrajectoryReader is returned.
+        """
+        if trajectory is not None:
+            return record_trajectory(
+                self.pm, trajectory, steps, record_every, conds=self.kwargs
+            )
+        return self.pm.run(steps, record_every=record_every)
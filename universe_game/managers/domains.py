@@ -0,0 +1,149 @@
+import multiprocessing
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from universe_game.neighbors import domain_turn_counts, prepare_headings
+
+# Forking a process that already runs threads (numexpr, numba's threading
+# layer) can deadlock the children, so the workers start from a fresh
+# interpreter
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+class DomainPool:
+    """
+    Worker processes that each count the neighbours of one spatial domain, see
+    neighbors.domain_turn_counts. This is a single-host, shared-read layout:
+    the positions, headings and effective radii of the whole cloud are
+    published once per step in shared memory, which every worker reads, so no
+    halo is exchanged. Each worker writes the counts of the rows it owns into
+    a shared output array and only exchanges a short message with the
+    coordinator per step.
+    """
+
+    def __init__(self, n_particles, n_domains, settings):
+        self.n_particles = n_particles
+        self.n_domains = n_domains
+        kernel_dtype = np.dtype(settings["kernel_dtype"])
+        state_dtype = np.dtype(settings["state_dtype"])
+        self._layout = {
+            "xy": ((2, n_particles), kernel_dtype.str),
+            "angles": ((n_particles,), state_dtype.str),
+            "radius_sq": ((n_particles,), kernel_dtype.str),
+            "counters": ((2, n_particles), np.dtype(np.int64).str),
+        }
+        self._blocks = {
+            name: SharedMemory(
+                create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            )
+            for name, (shape, dtype) in self._layout.items()
+        }
+        self.arrays = _attach_arrays(self._blocks, self._layout)
+        names = {name: block.name for name, block in self._blocks.items()}
+        self._connections = []
+        self._workers = []
+        for domain in range(n_domains):
+            connection, worker_connection = MP_CONTEXT.Pipe()
+            worker = MP_CONTEXT.Process(
+                target=_domain_worker,
+                args=(
+                    worker_connection,
+                    names,
+                    self._layout,
+                    domain,
+                    n_domains,
+                    settings,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._connections.append(connection)
+            self._workers.append(worker)
+        self._finalizer = weakref.finalize(
+            self, _shutdown, self._connections, self._workers, self._blocks
+        )
+
+    def turn_counts(self, x, y, angles, radius_sq, bounds):
+        """Count the left and right neighbours of every particle across the domains."""
+        arrays = self.arrays
+        arrays["xy"][0], arrays["xy"][1] = x, y
+        arrays["angles"][:] = angles
+        arrays["radius_sq"][:] = radius_sq
+        for connection in self._connections:
+            connection.send(bounds)
+        errors = [connection.recv() for connection in self._connections]
+        for error in errors:
+            if error is not None:
+                raise error
+        return arrays["counters"][0].copy(), arrays["counters"][1].copy()
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        self.arrays = None
+        self._finalizer()
+
+
+def _domain_worker(connection, names, layout, domain, n_domains, settings):
+    # The workers share the resource tracker of the coordinator, which unlinks
+    # the blocks when it closes the pool
+    blocks = {name: SharedMemory(name=block) for name, block in names.items()}
+    arrays = _attach_arrays(blocks, layout)
+    x, y = arrays["xy"]
+    counters = arrays["counters"]
+    kernel_dtype = np.dtype(settings["kernel_dtype"])
+    try:
+        while True:
+            bounds = connection.recv()
+            if bounds is None:
+                break
+            try:
+                headings = prepare_headings(
+                    arrays["angles"], settings["turn_kernel"], kernel_dtype
+                )
+                rows, left, right = domain_turn_counts(
+                    x,
+                    y,
+                    headings,
+                    arrays["radius_sq"],
+                    settings["radius"],
+                    domain,
+                    n_domains,
+                    bounds,
+                    tile_size=settings["tile_size"],
+                )
+                counters[0, rows], counters[1, rows] = left, right
+                connection.send(None)
+            except Exception as error:
+                connection.send(error)
+    finally:
+        del x, y, counters, arrays
+        for block in blocks.values():
+            block.close()
+
+
+def _attach_arrays(blocks, layout):
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+        for name, (shape, dtype) in layout.items()
+    }
+
+
+def _shutdown(connections, workers, blocks):
+    for connection in connections:
+        try:
+            connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+    for block in blocks.values():
+        try:
+            block.close()
+        except BufferError:
+            # Arrays of the pool are still alive at interpreter exit
+            pass
+        block.unlink()
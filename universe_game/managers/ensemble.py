@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from universe_game.managers.particle import ParticleManager
+from universe_game.neighbors import classify_pairs
+from universe_game.rng import spawn_seeds
+
+# Number of particle pairs evaluated at once, bounding the temporaries to a few 10 MB
+PAIR_BUDGET = 2**22
+# Settings of a ParticleManager the batched step implements. Any neighbour
+# engine is accepted, since they all give the same counts as "dense".
+ENSEMBLE_SETTINGS = {
+    "turn_kernel": "bearing",
+    "state_dtype": np.dtype(np.float64),
+    "kernel_dtype": np.dtype(np.float64),
+}
+
+
+class EnsembleParticleManager:
+    """
+    Advance M independent universes with the same number of particles in one
+    vectorised step. The positions are stored as an (M, N, 3) array, every
+    universe keeps its own parameters from its conds dict, and draws its random
+    numbers from its own streams spawned from `seed`. The step uses the
+    float64 bearing kernel, so conds setting another turn_kernel, state_dtype
+    or kernel_dtype are rejected, see ENSEMBLE_SETTINGS.
+    """
+
+    def __init__(self, conds_list, seed=None):
+        if isinstance(seed, (list, tuple)):
+            seeds = seed
+        else:
+            seeds = spawn_seeds(seed, len(conds_list))
+        # Every universe uses the random streams of its own ParticleManager, so it
+        # follows the same trajectory as when run on its own with that seed
+        self.members = [
+            ParticleManager(**{**conds, "seed": member_seed})
+            for conds, member_seed in zip(conds_list, seeds)
+        ]
+        for pm in self.members:
+            for name, supported in ENSEMBLE_SETTINGS.items():
+                if getattr(pm, name) != supported:
+                    raise ValueError(
+                        f"Ensembles only support {name}={str(supported)!r}, "
+                        f"got {str(getattr(pm, name))!r}."
+                    )
+        n_particles = {pm.n_particles for pm in self.members}
+        if len(n_particles) != 1:
+            raise ValueError("All universes of an ensemble need the same n_particles.")
+        self.n_universes = len(self.members)
+        self.n_particles = n_particles.pop()
+        for name in (
+            "velocity",
+            "radius",
+            "chance_for_global_radius",
+            "alpha",
+            "beta",
+            "box_width",
+            "clip_boundary",
+        ):
+            values = np.array([getattr(pm, name) for pm in self.members])
+            setattr(self, name, values[:, np.newaxis])
+        self.particle_pos = np.stack([pm.particle_pos for pm in self.members])
+        self._radius_draws = np.empty((self.n_universes, self.n_particles))
+        self._turn_draws = np.empty((self.n_universes, self.n_particles))
+
+    def run(self, steps, record_every=1):
+        """
+        Advance every universe `steps` times, returning an array of shape
+        (steps // record_every, M, N, 3) with a snapshot every `record_every` steps.
+        """
+        n_records = steps // record_every if record_every else 0
+        snapshots = np.empty(
+            (n_records,) + self.particle_pos.shape, dtype=self.particle_pos.dtype
+        )
+        for step in range(1, steps + 1):
+            self._update_particle_positions()
+            if record_every and step % record_every == 0:
+                snapshots[step // record_every - 1] = self.particle_pos
+        return snapshots
+
+    def _update_particle_positions(self):
+        self._move_particles_based_on_angle()
+        self._handle_boundary()
+        turns = self._calculate_turns()
+        self._apply_turns(turns)
+
+    def _move_particles_based_on_angle(self):
+        direction_angles = np.radians(self.particle_pos[..., 2])
+        self.particle_pos[..., 0] += self.velocity * np.cos(direction_angles)
+        self.particle_pos[..., 1] += self.velocity * np.sin(direction_angles)
+
+    def _handle_boundary(self):
+        x, y, angles = (self.particle_pos[..., k] for k in range(3))
+        clip = self.clip_boundary
+        for condition, angle in [
+            (clip & (x < 0), 180),
+            (clip & (x > self.box_width), 180),
+            (clip & (y > self.box_width), 360),
+            (clip & (y < 0), 360),
+        ]:
+            angles[condition] = angle - angles[condition]
+        angles[:] = np.where(clip, np.mod(angles, 360), angles)
+
+    def _calculate_turns(self):
+        effective_radius_sq = self._get_effective_radius_sq()
+        left_counter, right_counter = self._calculate_counters(effective_radius_sq)
+        return self._turns_from_counters(left_counter, right_counter)
+
+    def _get_effective_radius_sq(self, global_radius_sq=1000**2):
+        for pm, draws in zip(self.members, self._radius_draws):
+            pm.rngs["global_radius"].random(out=draws)
+        return np.where(
+            self._radius_draws < self.chance_for_global_radius,
+            self.radius * global_radius_sq,
+            self.radius**2,
+        )
+
+    def _calculate_counters(self, effective_radius_sq):
+        """Count the left/right neighbours of all universes in memory-bounded batches."""
+        n_particles = self.n_particles
+        rows_per_batch = int(min(n_particles, max(1, PAIR_BUDGET // n_particles)))
+        universes_per_batch = max(1, PAIR_BUDGET // (rows_per_batch * n_particles))
+        left_counter = np.empty(effective_radius_sq.shape, dtype=np.int64)
+        right_counter = np.empty(effective_radius_sq.shape, dtype=np.int64)
+        for u_start in range(0, self.n_universes, universes_per_batch):
+            universes = slice(u_start, u_start + universes_per_batch)
+            x = self.particle_pos[universes, np.newaxis, :, 0]
+            y = self.particle_pos[universes, np.newaxis, :, 1]
+            for r_start in range(0, n_particles, rows_per_batch):
+                rows = slice(r_start, r_start + rows_per_batch)
+                dx = self.particle_pos[universes, rows, 0, np.newaxis] - x
+                dy = self.particle_pos[universes, rows, 1, np.newaxis] - y
+                distances_sq = dx**2 + dy**2
+                left_mask, right_mask = classify_pairs(
+                    dx,
+                    dy,
+                    distances_sq,
+                    effective_radius_sq[universes, rows, np.newaxis],
+                    self.particle_pos[universes, rows, 2, np.newaxis],
+                )
+                left_counter[universes, rows] = left_mask.sum(axis=2)
+                right_counter[universes, rows] = right_mask.sum(axis=2)
+        return left_counter, right_counter
+
+    def _turns_from_counters(self, left_counter, right_counter):
+        direction_turn = np.sign(left_counter - right_counter)
+        no_neighbors = left_counter + right_counter == 0
+        random_turn_range = np.divide(
+            90, self.beta, out=np.zeros(self.beta.shape), where=self.beta != 0
+        )
+        for pm, draws in zip(self.members, self._turn_draws):
+            pm.rngs["random_turns"].random(out=draws)
+        coin_flips = self._turn_draws < 0.5
+        random_turns = np.where(coin_flips, -random_turn_range, random_turn_range)
+        # Assigning into the integer array truncates like the single-universe manager
+        direction_turn[no_neighbors] = random_turns[no_neighbors]
+        return direction_turn
+
+    def _apply_turns(self, turns):
+        self.particle_pos[..., 2] = np.mod(
+            self.particle_pos[..., 2] + (self.alpha + turns * self.beta), 360
+        )
+
+
+def run_ensemble(conds_list, steps, record_every=None, seed=None, n_workers=None):
+    """
+    Run the universes across a process pool, each worker advancing a batch of
+    them as one ensemble. Every universe gets its own seed sequence spawned
+    from `seed`, so the results do not depend on the number of workers.
+    Returns the snapshots of all universes, see EnsembleParticleManager.run;
+    by default only the final positions are recorded.
+    """
+    record_every = record_every or steps
+    seeds = spawn_seeds(seed, len(conds_list))
+    n_workers = n_workers or os.cpu_count()
+    bounds = np.linspace(0, len(conds_list), n_workers + 1).astype(int)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                _run_batch, conds_list[start:stop], seeds[start:stop], steps, record_every
+            )
+            for start, stop in zip(bounds[:-1], bounds[1:])
+            if stop > start
+        ]
+        return np.concatenate([future.result() for future in futures], axis=1)
+
+
+def _run_batch(conds_list, seeds, steps, record_every):
+    return EnsembleParticleManager(conds_list, seed=seeds).run(steps, record_every)
@@ -1,17 +1,31 @@
-import math
-import pygame
 import numpy as np
-from time import time
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from time import perf_counter, time
+from contextlib import nullcontext
 
-from universe_game.pygame_utils import compute_dynamic_scale_and_offset, lerp
+from universe_game.managers.pipeline import SimulationWorker
+from universe_game.pygame_utils import (
+    MAX_SPRITE_RADIUS,
+    circle_sprite,
+    compute_dynamic_scale_and_offset,
+    density_levels,
+    lerp,
+    percentile_bounds,
+    stamp_sprites,
+)
+from universe_game.recording import FrameRecorder
+from universe_game.trajectory import TrajectoryReader
+
+# From this many particles on they are drawn as a density field instead of one by one
+DENSITY_THRESHOLD = 100_000
 
 
 class GraphicsRenderer:
     """
     Class that manages the rendering of the particles and the window.
-    Currently supports pygame and matplotlib.
+    Currently supports pygame and matplotlib, each imported only by the method
+    that uses it, so neither is needed to run the other.
+    From `density_threshold` particles on (None to never) the particles are
+    binned into a per-pixel density image instead of drawn individually.
     """
 
     def __init__(self, particle_manager, **kwargs):
@@ -25,7 +39,13 @@ class GraphicsRenderer:
         self.box_width = kwargs.get("box_width", 5)
         self.save = kwargs.get("save", False)
         self.animation_speed = kwargs.get("animation_speed", 1)
+        self.density_threshold = kwargs.get("density_threshold", DENSITY_THRESHOLD)
+        self.draw_density = (
+            self.density_threshold is not None
+            and self.particle_manager.n_particles >= self.density_threshold
+        )
         self.particle_pos = self.particle_manager.particle_pos
+        self.profiler = self.particle_manager.profiler
         self.prev_scale_x, self.prev_scale_y = (
             800 / self.box_width,
             800 / self.box_width,
@@ -36,8 +56,24 @@ class GraphicsRenderer:
         self.i = 0
 
     def start_pygame(
-        self, window_size=(800, 800), save=False, filename="animation.mp4"
+        self,
+        window_size=(800, 800),
+        save=False,
+        filename="animation.mp4",
+        async_simulation=False,
+        steps_per_frame=1,
+        raw_frames=False,
     ):
+        """
+        Display the simulation in a pygame window, advancing it `steps_per_frame`
+        steps per frame. With async_simulation the physics runs on a background
+        thread into a double buffer, overlapping with the drawing and keeping the
+        window responsive when a step takes longer than a frame.
+        If save is True the frames are encoded to filename on a background thread,
+        or written unencoded if raw_frames is True (see recording.encode_raw_frames).
+        """
+        import pygame
+
         pygame.init()
         screen = pygame.display.set_mode(window_size)
         clock = pygame.time.Clock()
@@ -47,29 +83,23 @@ class GraphicsRenderer:
         # Create a separate surface for particles
         particle_surface = pygame.Surface(window_size, pygame.SRCALPHA)
         # Precompute x and y velocities for all particles
-        velocities = []
-
-        for _, _, angle in self.particle_pos:
-            radian = math.radians(angle)
-            vel_x = self.velocity * math.cos(radian)
-            vel_y = self.velocity * math.sin(radian)
-            velocities.append((vel_x, vel_y))
-
-        video_out = None
-        if save is True:
-            try:
-                import cv2
-            except ImportError:
-                raise ImportError(
-                    "You need to install opencv-python to save the animation using pygame."
-                )
-            fourcc = cv2.VideoWriter_fourcc(*"XVID")
-            video_out = cv2.VideoWriter(filename, fourcc, 60.0, window_size)
+        radians = np.radians(self.particle_pos[:, 2])
+        velocities = self.velocity * np.column_stack([np.cos(radians), np.sin(radians)])
+
+        recorder = FrameRecorder(filename, window_size, raw=raw_frames) if save else None
+        worker = None
+        if async_simulation:
+            worker = SimulationWorker(self.particle_manager, steps_per_frame)
+            worker.start()
         running = True
         while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+            if worker is not None and not worker.has_new_frame():
+                # Keep handling events while the simulation catches up
+                clock.tick(120)
+                continue
 
             screen.fill((255, 255, 255))  # Fill screen with white
             if self.draw_trails:
@@ -80,82 +110,255 @@ class GraphicsRenderer:
             else:
                 particle_surface.fill((0, 0, 0, 0))  # Clear particle surface
 
-            self.particle_manager._update_particle_positions()
-
-            scale_x, scale_y, offset_x, offset_y = compute_dynamic_scale_and_offset(
-                self.particle_manager.particle_pos, window_size, padding=0.2
-            )
+            if worker is None:
+                for _ in range(steps_per_frame):
+                    self.particle_manager._update_particle_positions()
+                frame = nullcontext(self.particle_manager.particle_pos)
+            else:
+                frame = worker.latest()
 
-            final_scale_x = lerp(self.prev_scale_x, scale_x, self.window_smooth)
-            final_scale_y = lerp(self.prev_scale_y, scale_y, self.window_smooth)
-            final_offset_x = lerp(self.prev_offset_x, offset_x, self.window_smooth)
-            final_offset_y = lerp(self.prev_offset_y, offset_y, self.window_smooth)
-
-            # Update particle positions based on precomputed velocities
-            for idx, particle in enumerate(self.particle_manager.particle_pos):
-                x, y, _ = particle
-                vel_x, vel_y = velocities[idx]
-                x += vel_x
-                y += vel_y
-                scaled_x = (x + final_offset_x) * final_scale_x
-                scaled_y = (y + final_offset_y) * final_scale_y
-                pygame.draw.circle(
+            with frame as positions:
+                self._draw_frame(
                     particle_surface,
-                    (0, 0, 0),
-                    (scaled_x, scaled_y),
+                    positions,
+                    velocities,
+                    window_size,
                     circle_radius,
                 )
-                if self.draw_radius:
-                    pygame.draw.circle(
-                        particle_surface,
-                        (0, 0, 0),
-                        (scaled_x, scaled_y),
-                        self.radius * max(final_scale_x, final_scale_y),
-                        1,
-                    )
-
             screen.blit(particle_surface, (0, 0))
 
-            # Update previous values for next frame
-            self.prev_scale_x, self.prev_scale_y = final_scale_x, final_scale_y
-            self.prev_offset_x, self.prev_offset_y = final_offset_x, final_offset_y
-
             # Render the FPS and blit it onto the screen
             if not save:
                 fps_text = font.render(f"FPS: {clock.get_fps():.2f}", True, (0, 0, 0))
                 screen.blit(fps_text, (10, 10))
+                self._draw_profile_overlay(screen, font)
             if self.i % self.animation_speed == 0:
-                pygame.display.flip()
+                with self.profiler.phase("flip"):
+                    pygame.display.flip()
                 # Record video frame
                 if save:
-                    frame = pygame.surfarray.array3d(screen)
-                    frame = frame.swapaxes(0, 1)
-                    video_out.write(frame)
+                    self._record_frame(recorder, screen)
 
             self.i += 1
-            clock.tick(120)
+            with self.profiler.phase("tick"):
+                clock.tick(120)
+        if worker is not None:
+            worker.stop()
         if save:
-            video_out.release()
+            recorder.close()
 
         pygame.quit()
 
-    def start_matplotlib(self, save=False, filename="animation.mp4", fps=60):
-        """Display the animation in a matplotlib animation. If save is True, save the animation to filename."""
-        fig, ax = self._setup_plot()
-        scatter = ax.scatter(
-            self.particle_manager.particle_pos[:, 0],
-            self.particle_manager.particle_pos[:, 1],
-            alpha=0.5,
+    def start_replay(
+        self,
+        trajectory,
+        window_size=(800, 800),
+        fps=None,
+        save=False,
+        filename="replay.mp4",
+        raw_frames=False,
+    ):
+        """
+        Play back a recorded trajectory without recomputing any physics.
+        Frames are read on demand from the memory-mapped file. SPACE pauses,
+        LEFT/RIGHT jump back/forward by one second of frames. If fps is None the
+        playback is only limited by the display.
+        """
+        import pygame
+
+        if isinstance(trajectory, str):
+            trajectory = TrajectoryReader(trajectory)
+        pygame.init()
+        screen = pygame.display.set_mode(window_size)
+        clock = pygame.time.Clock()
+        font = pygame.font.Font(None, 30)
+        circle_radius = 5
+        particle_surface = pygame.Surface(window_size, pygame.SRCALPHA)
+        recorder = FrameRecorder(filename, window_size, raw=raw_frames) if save else None
+        seek_frames = fps or 60
+        frame_index, paused, running = 0, False, True
+        while running and frame_index < len(trajectory):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_LEFT:
+                    frame_index = max(frame_index - seek_frames, 0)
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_RIGHT:
+                    frame_index = min(frame_index + seek_frames, len(trajectory) - 1)
+
+            screen.fill((255, 255, 255))
+            particle_surface.fill((0, 0, 0, 0))
+            self._draw_frame(
+                particle_surface,
+                trajectory[frame_index],
+                None,
+                window_size,
+                circle_radius,
+            )
+            screen.blit(particle_surface, (0, 0))
+            if not save:
+                step = frame_index * trajectory.record_every
+                text = f"FPS: {clock.get_fps():.2f}  step: {step}"
+                screen.blit(font.render(text, True, (0, 0, 0)), (10, 10))
+                self._draw_profile_overlay(screen, font)
+            with self.profiler.phase("flip"):
+                pygame.display.flip()
+            if save:
+                self._record_frame(recorder, screen)
+            if not paused:
+                frame_index += 1
+            with self.profiler.phase("tick"):
+                clock.tick(fps or 0)
+        if save:
+            recorder.close()
+
+        pygame.quit()
+
+    def _draw_frame(self, surface, positions, velocities, window_size, circle_radius):
+        """Draw the particles onto the surface, smoothly following the cloud."""
+        with self.profiler.phase("transform"):
+            coords = self._transform_frame(positions, velocities, window_size)
+        with self.profiler.phase("draw"):
+            if self.draw_density:
+                self._blit_density(surface, coords)
+            else:
+                self._stamp_frame(surface, coords, circle_radius)
+
+    def _transform_frame(self, positions, velocities, window_size):
+        """Return the screen coordinates of the particles, updating the viewport."""
+        scale_x, scale_y, offset_x, offset_y = compute_dynamic_scale_and_offset(
+            positions, window_size, padding=0.2
+        )
+
+        final_scale_x = lerp(self.prev_scale_x, scale_x, self.window_smooth)
+        final_scale_y = lerp(self.prev_scale_y, scale_y, self.window_smooth)
+        final_offset_x = lerp(self.prev_offset_x, offset_x, self.window_smooth)
+        final_offset_y = lerp(self.prev_offset_y, offset_y, self.window_smooth)
+
+        # Transform all particles to screen coordinates at once
+        coords = positions[:, :2]
+        if velocities is not None:
+            coords = coords + velocities
+        coords = (coords + (final_offset_x, final_offset_y)) * (
+            final_scale_x,
+            final_scale_y,
         )
 
+        # Update previous values for next frame
+        self.prev_scale_x, self.prev_scale_y = final_scale_x, final_scale_y
+        self.prev_offset_x, self.prev_offset_y = final_offset_x, final_offset_y
+        return coords
+
+    def _stamp_frame(self, surface, coords, circle_radius):
+        stamp_sprites(surface, coords, circle_sprite(circle_radius))
+        if self.draw_radius:
+            outline_radius = self.radius * max(self.prev_scale_x, self.prev_scale_y)
+            if outline_radius <= MAX_SPRITE_RADIUS:
+                stamp_sprites(surface, coords, circle_sprite(outline_radius, width=1))
+            else:
+                # Blitting huge sprites costs more than drawing the outlines
+                import pygame
+
+                for scaled_x, scaled_y in coords.tolist():
+                    pygame.draw.circle(
+                        surface, (0, 0, 0), (scaled_x, scaled_y), outline_radius, 1
+                    )
+
+    def _blit_density(self, surface, coords):
+        """Darken every pixel of the transparent surface by its particle density."""
+        import pygame
+
+        levels = density_levels(coords, surface.get_size())
+        occupied = levels > 0
+        colors = pygame.surfarray.pixels3d(surface)
+        colors[occupied] = 0
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        # The maximum keeps the fading trails drawn on earlier frames
+        np.maximum(alpha, levels, out=alpha)
+        del colors, alpha  # Unlock the surface for blitting
+
+    def _record_frame(self, recorder, screen):
+        import pygame
+
+        with self.profiler.phase("encode"):
+            recorder.write(pygame.surfarray.pixels3d(screen).swapaxes(0, 1))
+
+    def _draw_profile_overlay(self, screen, font):
+        """Blit the mean time of every profiled phase below the FPS."""
+        for row, line in enumerate(self.profiler.overlay_lines()):
+            screen.blit(font.render(line, True, (0, 0, 0)), (10, 40 + 24 * row))
+
+    def start_matplotlib(
+        self,
+        save=False,
+        filename="animation.mp4",
+        fps=60,
+        raw_frames=False,
+        save_count=100,
+    ):
+        """
+        Display the animation in a matplotlib animation. If save is True, the frames
+        are recorded to filename as they are drawn, encoding on a background thread.
+        With a non-interactive backend nothing is displayed, so `save_count` frames
+        are drawn off-screen instead.
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.animation import FuncAnimation
+
+        fig, ax = self._setup_plot()
+        if self.draw_density:
+            bbox = ax.get_window_extent()
+            artist = ax.imshow(
+                np.zeros((max(int(bbox.height), 1), max(int(bbox.width), 1))),
+                cmap="Greys",
+                vmin=0,
+                vmax=255,
+                origin="lower",
+                interpolation="nearest",
+                aspect="auto",
+            )
+            # imshow resets the limits to the extent of the image
+            self._recalculate_limits(ax)
+            self._update_density_image(ax, artist)
+        else:
+            artist = ax.scatter(
+                self.particle_manager.particle_pos[:, 0],
+                self.particle_manager.particle_pos[:, 1],
+                alpha=0.5,
+            )
+        overlay = None
+        if self.profiler.enabled:
+            overlay = ax.text(
+                0.01, 0.99, "", transform=ax.transAxes, va="top", fontsize=8
+            )
+        update_end = None
+
         def update(frame):
+            nonlocal update_end
             self.particle_manager._update_particle_positions()
-            scatter.set_offsets(self.particle_manager.particle_pos[:, :2])
-            self._update_plot_title(ax)
-            if self.clip_boundary is False:
-                self._recalculate_limits(ax)
+            with self.profiler.phase("transform"):
+                self._update_plot_title(ax)
+                if self.clip_boundary is False:
+                    self._recalculate_limits(ax)
+                if self.draw_density:
+                    self._update_density_image(ax, artist)
+                else:
+                    artist.set_offsets(self.particle_manager.particle_pos[:, :2])
+            if overlay is not None:
+                overlay.set_text("\n".join(self.profiler.overlay_lines()))
+            update_end = perf_counter()
 
-            return (scatter,)
+            return (artist,)
+
+        def on_draw(event):
+            # matplotlib draws the canvas after update returns
+            if update_end is not None:
+                self.profiler.record("draw", perf_counter() - update_end)
+            if recorder is not None:
+                with self.profiler.phase("encode"):
+                    recorder.write(np.asarray(event.canvas.buffer_rgba())[..., :3])
 
         ani = FuncAnimation(
             fig,
@@ -165,11 +368,23 @@ class GraphicsRenderer:
             interval=self.update_interval,
             repeat=True,
         )
+        recorder = None
         if save:
-            ani.save(filename, fps=fps, dpi=300)
+            recorder = FrameRecorder(
+                filename, fig.canvas.get_width_height(), fps, raw=raw_frames
+            )
+        fig.canvas.mpl_connect("draw_event", on_draw)
         plt.show()
+        if recorder is not None:
+            if recorder.n_frames == 0:
+                for frame in range(save_count):
+                    update(frame)
+                    fig.canvas.draw()
+            recorder.close()
 
     def _setup_plot(self):
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         self._recalculate_limits(ax)
         return fig, ax
@@ -182,13 +397,18 @@ class GraphicsRenderer:
     def _recalculate_limits(self, ax):
         if ax is None:
             return
-        x_low = np.percentile(self.particle_manager.particle_pos[:, 0], 3) - self.radius
-        x_high = (
-            np.percentile(self.particle_manager.particle_pos[:, 0], 97) + self.radius
-        )
-        y_low = np.percentile(self.particle_manager.particle_pos[:, 1], 3) - self.radius
-        y_high = (
-            np.percentile(self.particle_manager.particle_pos[:, 1], 97) + self.radius
+        x_low, x_high = percentile_bounds(self.particle_manager.particle_pos[:, 0])
+        y_low, y_high = percentile_bounds(self.particle_manager.particle_pos[:, 1])
+        ax.set_xlim(x_low - self.radius, x_high + self.radius)
+        ax.set_ylim(y_low - self.radius, y_high + self.radius)
+
+    def _update_density_image(self, ax, image):
+        """Bin the particles into the image at its resolution, over the current limits."""
+        (x_low, x_high), (y_low, y_high) = ax.get_xlim(), ax.get_ylim()
+        height, width = image.get_array().shape
+        coords = (self.particle_manager.particle_pos[:, :2] - (x_low, y_low)) * (
+            width / (x_high - x_low),
+            height / (y_high - y_low),
         )
-        ax.set_xlim(x_low, x_high)
-        ax.set_ylim(y_low, y_high)
+        image.set_data(density_levels(coords, (width, height)).T)
+        image.set_extent((x_low, x_high, y_low, y_high))
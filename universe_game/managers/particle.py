@@ -1,6 +1,23 @@
+import os
+import warnings
 import numpy as np
 import numexpr as ne
-from universe_game.distributions import hexagonal_lattice
+from universe_game.analytics import ANALYTICS_CAPACITY, NullAnalytics, StepAnalytics
+from universe_game.distributions import DISTRIBUTIONS
+from universe_game.profiler import NullProfiler, StepProfiler
+from universe_game.rng import spawn_generators
+from universe_game.neighbors import (
+    TURN_KERNELS,
+    dense_turn_counts,
+    exact_global_turn_counts,
+    grid_turn_counts,
+    neighbor_pairs,
+    pair_turn_counts,
+    prepare_headings,
+)
+
+
+NEIGHBOR_ENGINES = ("dense", "tiled", "grid", "verlet", "numba", "domains")
 
 
 class ParticleManager:
@@ -13,122 +30,453 @@ class ParticleManager:
         self.beta = kwargs.get("beta", 1)
         self.box_width = kwargs.get("box_width", 1)
         self.clip_boundary = kwargs.get("clip_boundary", True)
+        # Name of the initial distribution, see universe_game.distributions, and
+        # the keyword arguments of its generator
         self.distribution = kwargs.get("distribution", "uniform")
+        self.distribution_params = kwargs.get("distribution_params", {})
         self.initial_range = kwargs.get("initial_range", self.box_width)
-        self.particle_pos = self._initialize_particle_positions()
+        self.neighbor_engine = kwargs.get("neighbor_engine", "dense")
+        self.tile_size = kwargs.get("tile_size", 256)
+        # Extra distance listed by the verlet engine, so the list stays valid
+        # until a particle has moved verlet_skin / 2
+        self.verlet_skin = kwargs.get("verlet_skin", 0.25 * self.radius)
+        self.verlet_rebuilds = 0
+        self._verlet_list = None
+        # Number of worker processes of the domains engine, one per strip of the box
+        self.n_domains = kwargs.get("n_domains", os.cpu_count())
+        self._domain_pool = None
+        self.turn_kernel = kwargs.get("turn_kernel", "bearing")
+        # dtype of the particle state; float32 halves the memory of the state,
+        # the dense workspace and recordings
+        self.state_dtype = np.dtype(kwargs.get("state_dtype", "float64"))
+        self.kernel_dtype = np.dtype(kwargs.get("kernel_dtype", self.state_dtype))
+        if self.neighbor_engine not in NEIGHBOR_ENGINES:
+            raise ValueError(
+                f"Unknown neighbor_engine {self.neighbor_engine!r}, "
+                f"expected one of {NEIGHBOR_ENGINES}"
+            )
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown distribution {self.distribution!r}, "
+                f"expected one of {list(DISTRIBUTIONS)}"
+            )
+        if self.turn_kernel not in TURN_KERNELS:
+            raise ValueError(
+                f"Unknown turn_kernel {self.turn_kernel!r}, "
+                f"expected one of {TURN_KERNELS}"
+            )
+        self.n_threads = kwargs.get("n_threads", None)
+        if self.n_threads is not None:
+            ne.set_num_threads(self.n_threads)
+        if self.neighbor_engine == "numba":
+            # numba takes a while to import, so only load it for its engine
+            from universe_game import numba_kernels
 
-    def _initialize_particle_positions(self):
-        if self.distribution == "uniform":
-            positions = np.random.rand(self.n_particles, 3)
-            box_center = self.box_width / 2
-            positions[:, 0:2] *= self.initial_range
-            positions[:, 0:2] -= self.initial_range / 2
-            positions[:, 0:2] += box_center
-        elif self.distribution == "hexagonal":
-            positions = hexagonal_lattice(
-                n_particles=self.n_particles, radius=self.radius
+            if numba_kernels.NUMBA_AVAILABLE:
+                numba_kernels.set_num_threads(self.n_threads)
+            else:
+                warnings.warn("numba is not installed, falling back to the tiled engine.")
+                self.neighbor_engine = "tiled"
+        # An int or SeedSequence makes the run reproducible; None seeds from the OS
+        self.seed = kwargs.get("seed", None)
+        self.rngs = spawn_generators(self.seed)
+        # The per-step draws are written into these instead of new arrays
+        self._radius_draws = np.empty(n_particles)
+        self._turn_draws = np.empty(n_particles)
+        self.workspace = self._allocate_workspace()
+        # Per-phase timings, see universe_game.profiler
+        self.profiler = (
+            StepProfiler() if kwargs.get("profile", False) else NullProfiler()
+        )
+        # Metrics evaluated every analytics_every steps, see universe_game.analytics.
+        # True records every registered metric, a list only the named ones
+        analytics = kwargs.get("analytics", False)
+        self.analytics = (
+            StepAnalytics(
+                metrics=None if analytics is True else analytics,
+                every=kwargs.get("analytics_every", 10),
+                capacity=kwargs.get("analytics_capacity", ANALYTICS_CAPACITY),
             )
-            self.box_width = np.max(positions[:, 0:2])
-        positions[:, 2] *= 360
-        return positions
+            if analytics
+            else NullAnalytics()
+        )
+        self._pair_workspace = None
+        # Structure of arrays: contiguous x, y and heading (in degrees) rows,
+        # with particle_pos an (n_particles, 3) view of the same memory
+        self.state = np.empty((3, n_particles), dtype=self.state_dtype)
+        self.x, self.y, self.angles = self.state
+        self.particle_pos = self.state.T
+        self._initialize_particle_positions()
+
+    def _allocate_workspace(self):
+        """Per-particle output buffers reused by every step."""
+        n_particles = self.n_particles
+        dtype = self.state_dtype
+        return {
+            "cos": np.empty(n_particles, dtype=dtype),
+            "sin": np.empty(n_particles, dtype=dtype),
+            "condition": np.empty(n_particles, dtype=bool),
+            "radius_sq": np.empty(n_particles, dtype=dtype),
+            "left_counter": np.empty(n_particles, dtype=np.int64),
+            "right_counter": np.empty(n_particles, dtype=np.int64),
+            "direction_turn": np.empty(n_particles, dtype=np.int64),
+            "neighbor_count": np.empty(n_particles, dtype=np.int64),
+            "no_neighbors": np.empty(n_particles, dtype=bool),
+            "random_turns": np.empty(n_particles, dtype=dtype),
+            "angle_change": np.empty(n_particles, dtype=dtype),
+        }
+
+    def _get_pair_workspace(self):
+        """
+        N x N buffers of the dense path, only allocated on its first step so
+        the other engines never hold them.
+        """
+        if self._pair_workspace is None:
+            shape = (self.n_particles, self.n_particles)
+            dtype = self.state_dtype
+            self._pair_workspace = {
+                "dx": np.empty(shape, dtype=dtype),
+                "dy": np.empty(shape, dtype=dtype),
+                "distances_sq": np.empty(shape, dtype=dtype),
+                "bearings": np.empty(shape, dtype=dtype),
+                "within_radius": np.empty(shape, dtype=bool),
+                "left_mask": np.empty(shape, dtype=bool),
+                "right_mask": np.empty(shape, dtype=bool),
+            }
+        return self._pair_workspace
+
+    def _initialize_particle_positions(self):
+        """Fill the state in place with the generator of the distribution."""
+        generator = DISTRIBUTIONS[self.distribution]
+        generator(
+            self, self.state, self.rngs["initial_positions"], **self.distribution_params
+        )
+
+    def run(self, steps, record_every=1):
+        """
+        Advance the simulation `steps` times without rendering.
+        Returns an array of shape (steps // record_every, n_particles, 3) with a
+        snapshot of the particle positions every `record_every` steps, or an
+        empty one if record_every is 0.
+        """
+        if record_every < 0:
+            raise ValueError(f"record_every must not be negative, got {record_every}")
+        n_records = steps // record_every if record_every else 0
+        snapshots = np.empty(
+            (n_records,) + self.particle_pos.shape, dtype=self.state_dtype
+        )
+        if n_records == 0:
+            for _ in range(steps):
+                self._update_particle_positions()
+            return snapshots
+        for index, (_, positions) in enumerate(self.stream(steps, record_every)):
+            snapshots[index] = positions
+        for _ in range(steps - n_records * record_every):
+            self._update_particle_positions()
+        return snapshots
+
+    def stream(self, steps, record_every=1):
+        """
+        Advance the simulation `steps` times, yielding (step, particle_pos) every
+        `record_every` steps. The yielded array is updated in place by the next
+        step, so copy it to keep it.
+        """
+        if record_every < 1:
+            raise ValueError(f"record_every must be at least 1, got {record_every}")
+        for step in range(1, steps + 1):
+            self._update_particle_positions()
+            if step % record_every == 0:
+                yield step, self.particle_pos
 
     def _update_particle_positions(self):
-        self._move_particles_based_on_angle()
+        profiler = self.profiler
+        with profiler.phase("move"):
+            self._move_particles_based_on_angle()
         if self.clip_boundary:
-            self._handle_boundary()
+            with profiler.phase("boundary"):
+                self._handle_boundary()
         turns = self._calculate_turns()
-        self._apply_turns(turns)
+        with profiler.phase("apply"):
+            self._apply_turns(turns)
+        if self.analytics.enabled:
+            with profiler.phase("analytics"):
+                self.analytics.update(self)
 
     def _move_particles_based_on_angle(self):
-        direction_angles = np.radians(self.particle_pos[:, 2])
-        cos_vals, sin_vals = np.cos(direction_angles), np.sin(direction_angles)
-        self.particle_pos[:, 0] += self.velocity * cos_vals
-        self.particle_pos[:, 1] += self.velocity * sin_vals
+        cos_vals, sin_vals = self.workspace["cos"], self.workspace["sin"]
+        direction_angles = np.radians(self.angles, out=sin_vals)
+        np.cos(direction_angles, out=cos_vals)
+        np.sin(direction_angles, out=sin_vals)
+        cos_vals *= self.velocity
+        sin_vals *= self.velocity
+        self.x += cos_vals
+        self.y += sin_vals
 
     def _calculate_turns(self):
-        effective_radius_sq = self._get_effective_radius_sq()
-        dx, dy, distances_sq = self._calculate_relative_distances()
-        relative_bearings = self._calculate_relative_bearings(dx, dy)
+        profiler = self.profiler
+        with profiler.phase("radius"):
+            effective_radius_sq = self._get_effective_radius_sq()
+        if not self._uses_reference_kernel():
+            with profiler.phase("counters"):
+                left_counter, right_counter = self._calculate_counters(
+                    effective_radius_sq
+                )
+            with profiler.phase("turns"):
+                return self._turns_from_counters(left_counter, right_counter)
+        with profiler.phase("distances"):
+            dx, dy, distances_sq = self._calculate_relative_distances()
+        with profiler.phase("bearings"):
+            relative_bearings = self._calculate_relative_bearings(dx, dy)
         direction_turn = self._determine_turn_direction(
             distances_sq, relative_bearings, effective_radius_sq
         )
         return direction_turn
 
+    def _uses_reference_kernel(self):
+        return (
+            self.neighbor_engine == "dense"
+            and self.turn_kernel == "bearing"
+            and self.kernel_dtype == self.state_dtype
+        )
+
+    def _calculate_counters(self, effective_radius_sq):
+        """Count the left/right neighbours of every particle with the selected engine."""
+        x = self.x.astype(self.kernel_dtype, copy=False)
+        y = self.y.astype(self.kernel_dtype, copy=False)
+        headings = prepare_headings(self.angles, self.turn_kernel, self.kernel_dtype)
+        radius_sq = effective_radius_sq.astype(self.kernel_dtype)
+        if self.neighbor_engine == "numba":
+            from universe_game import numba_kernels
+
+            return numba_kernels.fused_turn_counts(x, y, headings, radius_sq)
+        if self.neighbor_engine == "domains":
+            return self._calculate_domain_counters(x, y, radius_sq)
+        if self.neighbor_engine in ("grid", "verlet"):
+            local_rows = effective_radius_sq <= self.radius**2
+            return self._calculate_grid_counters(x, y, headings, radius_sq, local_rows)
+        tile_size = self.tile_size if self.neighbor_engine == "tiled" else None
+        return dense_turn_counts(
+            x,
+            y,
+            headings,
+            radius_sq,
+            np.arange(self.n_particles),
+            tile_size=tile_size,
+        )
+
     def _get_effective_radius_sq(self, global_radius_sq=1000**2):
         global_radius_sq = self.radius * global_radius_sq
-        global_radius_mask = (
-            np.random.rand(self.n_particles) < self.chance_for_global_radius
+        self.rngs["global_radius"].random(out=self._radius_draws)
+        global_radius_mask = np.less(
+            self._radius_draws,
+            self.chance_for_global_radius,
+            out=self.workspace["condition"],
         )
-        return np.where(global_radius_mask, global_radius_sq, self.radius**2)
+        effective_radius_sq = self.workspace["radius_sq"]
+        effective_radius_sq.fill(self.radius**2)
+        np.copyto(effective_radius_sq, global_radius_sq, where=global_radius_mask)
+        return effective_radius_sq
 
     def _calculate_relative_distances(self):
-        x = self.particle_pos[:, 0]
-        y = self.particle_pos[:, 1]
+        workspace = self._get_pair_workspace()
+        x = self.x
+        y = self.y
         x_newaxis = x[:, np.newaxis]
         y_newaxis = y[:, np.newaxis]
-        dx = ne.evaluate("x_newaxis - x")
-        dy = ne.evaluate("y_newaxis - y")
-        distances = ne.evaluate("dx**2 + dy**2")
+        dx = ne.evaluate("x_newaxis - x", out=workspace["dx"])
+        dy = ne.evaluate("y_newaxis - y", out=workspace["dy"])
+        distances = ne.evaluate("dx**2 + dy**2", out=workspace["distances_sq"])
         return dx, dy, distances
 
     def _calculate_relative_bearings(self, dx, dy):
-        bearings = ne.evaluate("arctan2(dy, dx)")
-        degrees_conversion_factor = 180 / np.pi
-        particle_angles = self.particle_pos[:, 2, np.newaxis]
+        # The bearings are converted to relative bearings in place
+        bearings = ne.evaluate(
+            "arctan2(dy, dx)", out=self._get_pair_workspace()["bearings"]
+        )
+        # A constant of the state dtype keeps numexpr from upcasting float32
+        degrees_conversion_factor = self.state_dtype.type(180 / np.pi)
+        particle_angles = self.angles[:, np.newaxis]
         relative_bearings = ne.evaluate(
-            "bearings * degrees_conversion_factor - particle_angles"
+            "bearings * degrees_conversion_factor - particle_angles", out=bearings
         )
         adjusted_relative_bearings = ne.evaluate(
-            "(relative_bearings + 180) % 360 - 180"
+            "(relative_bearings + 180) % 360 - 180", out=relative_bearings
         )
         return adjusted_relative_bearings
 
     def _determine_turn_direction(
         self, distances_sq, relative_bearings, effective_radius_sq
     ):
-        left_mask, right_mask = self._get_turn_masks(
-            distances_sq, relative_bearings, effective_radius_sq
+        with self.profiler.phase("masks"):
+            left_mask, right_mask = self._get_turn_masks(
+                distances_sq, relative_bearings, effective_radius_sq
+            )
+        with self.profiler.phase("turns"):
+            left_counter = left_mask.sum(axis=1, out=self.workspace["left_counter"])
+            right_counter = right_mask.sum(
+                axis=1, out=self.workspace["right_counter"]
+            )
+            return self._turns_from_counters(left_counter, right_counter)
+
+    def _turns_from_counters(self, left_counter, right_counter):
+        workspace = self.workspace
+        direction_turn = np.subtract(
+            left_counter, right_counter, out=workspace["direction_turn"]
         )
-        left_counter = left_mask.sum(axis=1)
-        right_counter = right_mask.sum(axis=1)
-        direction_turn = np.sign(left_counter - right_counter)
-        no_neighbors = left_counter + right_counter == 0
-        random_turn_range = 90 / self.beta if self.beta != 0 else 0
-        random_turns = np.random.choice(
-            [-random_turn_range, random_turn_range], size=no_neighbors.sum()
+        np.sign(direction_turn, out=direction_turn)
+        neighbor_count = np.add(
+            left_counter, right_counter, out=workspace["neighbor_count"]
         )
-        direction_turn[no_neighbors] = random_turns
+        no_neighbors = np.equal(neighbor_count, 0, out=workspace["no_neighbors"])
+        random_turn_range = 90 / self.beta if self.beta != 0 else 0
+        # One coin flip per particle keeps the stream independent of the counts
+        self.rngs["random_turns"].random(out=self._turn_draws)
+        coin_flips = np.less(self._turn_draws, 0.5, out=workspace["condition"])
+        random_turns = workspace["random_turns"]
+        random_turns.fill(random_turn_range)
+        np.negative(random_turns, out=random_turns, where=coin_flips)
+        # The unsafe cast truncates the random turns like assigning into the int array
+        np.copyto(direction_turn, random_turns, where=no_neighbors, casting="unsafe")
 
         return direction_turn
 
+    def _calculate_grid_counters(self, x, y, headings, radius_sq, local_rows):
+        """
+        Count the left/right neighbours using a cell list for the local-radius
+        particles and half-plane counting for the global-radius ones. Global
+        particles whose radius does not cover the whole cloud fall back to an
+        exact dense row scan.
+        """
+        global_rows = np.flatnonzero(~local_rows)
+        local_rows = np.flatnonzero(local_rows)
+        left_counter = np.zeros(self.n_particles, dtype=np.int64)
+        right_counter = np.zeros(self.n_particles, dtype=np.int64)
+        if len(local_rows) and self.radius > 0 and self.neighbor_engine == "verlet":
+            left, right = self._calculate_verlet_counters(
+                x, y, headings, radius_sq, local_rows
+            )
+            left_counter[local_rows], right_counter[local_rows] = left, right
+        elif len(local_rows) and self.radius > 0:
+            left_counter[local_rows], right_counter[local_rows] = grid_turn_counts(
+                x, y, headings, radius_sq, local_rows, cell_size=self.radius
+            )
+        if len(global_rows):
+            left_counter[global_rows], right_counter[global_rows] = (
+                exact_global_turn_counts(
+                    x, y, headings, radius_sq, global_rows, tile_size=self.tile_size
+                )
+            )
+        return left_counter, right_counter
+
+    def _calculate_verlet_counters(self, x, y, headings, radius_sq, local_rows):
+        """
+        Count the neighbours of the local-radius particles among the pairs of
+        the Verlet list, which holds every pair within radius + verlet_skin
+        when it was built. While no particle has moved more than half the skin
+        since then, no pair can have come within the radius unlisted.
+        """
+        if self._verlet_list_expired():
+            first, second = neighbor_pairs(x, y, self.radius + self.verlet_skin)
+            self._verlet_list = {
+                "first": first,
+                "second": second,
+                "x": self.x.copy(),
+                "y": self.y.copy(),
+            }
+            self.verlet_rebuilds += 1
+        first, second = self._verlet_list["first"], self._verlet_list["second"]
+        is_local = np.zeros(self.n_particles, dtype=bool)
+        is_local[local_rows] = True
+        listed = is_local[first]
+        left_counter, right_counter = pair_turn_counts(
+            x,
+            y,
+            headings,
+            radius_sq,
+            first[listed],
+            second[listed],
+            self.n_particles,
+        )
+        return left_counter[local_rows], right_counter[local_rows]
+
+    def _calculate_domain_counters(self, x, y, radius_sq):
+        """
+        Count the neighbours in worker processes, each owning one strip of the
+        box, see managers.domains.DomainPool. Without a box (clip_boundary=False)
+        the strips split the extent of the cloud instead.
+        """
+        if self._domain_pool is None:
+            from .domains import DomainPool
+
+            self._domain_pool = DomainPool(
+                self.n_particles,
+                self.n_domains,
+                {
+                    "radius": self.radius,
+                    "turn_kernel": self.turn_kernel,
+                    "kernel_dtype": self.kernel_dtype.str,
+                    "state_dtype": self.state_dtype.str,
+                    "tile_size": self.tile_size,
+                },
+            )
+        if self.clip_boundary:
+            bounds = (0.0, float(self.box_width))
+        else:
+            bounds = (float(x.min()), float(x.max()))
+        return self._domain_pool.turn_counts(x, y, self.angles, radius_sq, bounds)
+
+    def close(self):
+        """Stop the worker processes of the domains engine, if any."""
+        if self._domain_pool is not None:
+            self._domain_pool.close()
+            self._domain_pool = None
+
+    def _verlet_list_expired(self):
+        if self._verlet_list is None:
+            return True
+        displacement_sq = (self.x - self._verlet_list["x"]) ** 2 + (
+            self.y - self._verlet_list["y"]
+        ) ** 2
+        return displacement_sq.max() > (self.verlet_skin / 2) ** 2
+
     def _get_turn_masks(self, distances_sq, relative_bearings, effective_radius_sq):
+        workspace = self._get_pair_workspace()
         effective_radius_sq_newaxis = effective_radius_sq[:, np.newaxis]
         within_radius = ne.evaluate(
-            "(distances_sq < effective_radius_sq_newaxis) & (distances_sq > 0)"
+            "(distances_sq < effective_radius_sq_newaxis) & (distances_sq > 0)",
+            out=workspace["within_radius"],
+        )
+        left_mask = ne.evaluate(
+            "within_radius & (relative_bearings < 0)", out=workspace["left_mask"]
+        )
+        right_mask = ne.evaluate(
+            "within_radius & (relative_bearings > 0)", out=workspace["right_mask"]
         )
-        left_mask = ne.evaluate("within_radius & (relative_bearings < 0)")
-        right_mask = ne.evaluate("within_radius & (relative_bearings > 0)")
         return left_mask, right_mask
 
     def _apply_turns(self, turns):
-        self.particle_pos[:, 2] = np.mod(
-            self.particle_pos[:, 2] + (self.alpha + turns * self.beta), 360
-        )
+        angle_change = np.multiply(turns, self.beta, out=self.workspace["angle_change"])
+        np.add(self.alpha, angle_change, out=angle_change)
+        self.angles += angle_change
+        np.mod(self.angles, 360, out=self.angles)
 
     def _handle_boundary(self):
         self._reflect_off_boundaries()
-        self.particle_pos[:, 2] = np.mod(self.particle_pos[:, 2], 360)
+        np.mod(self.angles, 360, out=self.angles)
 
     def _reflect_off_boundaries(self):
-        conditions = [
-            (self.particle_pos[:, 0] < 0, 180),
-            (self.particle_pos[:, 0] > self.box_width, 180),
-            (self.particle_pos[:, 1] > self.box_width, 360),
-            (self.particle_pos[:, 1] < 0, 360),
-        ]
-
-        for condition, angle in conditions:
-            self.particle_pos[condition, 2] = angle - self.particle_pos[condition, 2]
+        x, y, angles = self.x, self.y, self.angles
+        condition = self.workspace["condition"]
+        conditions = (
+            (np.less, x, 0, 180),
+            (np.greater, x, self.box_width, 180),
+            (np.greater, y, self.box_width, 360),
+            (np.less, y, 0, 360),
+        )
+
+        for compare, coordinate, bound, angle in conditions:
+            compare(coordinate, bound, out=condition)
+            np.subtract(angle, angles, out=angles, where=condition)
             # self.particle_pos[condition, 0] = np.clip(
             #     self.particle_pos[condition, 0], 0, self.box_width
             # )
@@ -0,0 +1,67 @@
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Advance a particle manager on a background thread while the renderer draws.
+    Every `steps_per_frame` steps the positions are copied into the back one of
+    two preallocated buffers, which becomes the front buffer once the renderer
+    has drawn the previous frame. NumPy, numexpr and numba release the GIL in
+    their kernels, so the physics overlaps with the drawing.
+    """
+
+    def __init__(self, particle_manager, steps_per_frame=1):
+        super().__init__(daemon=True)
+        self.particle_manager = particle_manager
+        self.steps_per_frame = steps_per_frame
+        self.buffers = [
+            particle_manager.particle_pos.copy(),
+            particle_manager.particle_pos.copy(),
+        ]
+        self.front = 0
+        self.version = 0
+        self._drawn_version = -1
+        self.error = None
+        self._swap_lock = threading.Lock()
+        self._drawn = threading.Event()
+        self._drawn.set()
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                for _ in range(self.steps_per_frame):
+                    self.particle_manager._update_particle_positions()
+                back = 1 - self.front
+                np.copyto(self.buffers[back], self.particle_manager.particle_pos)
+                # Only swap once the current front buffer has been drawn
+                while not self._drawn.wait(timeout=0.05):
+                    if self._stopped.is_set():
+                        return
+                with self._swap_lock:
+                    self.front = back
+                    self.version += 1
+                    self._drawn.clear()
+        except Exception as error:
+            self.error = error
+
+    def has_new_frame(self):
+        """Whether a frame was published since the last call to `latest`."""
+        if self.error is not None:
+            raise self.error
+        return self.version != self._drawn_version
+
+    @contextmanager
+    def latest(self):
+        """Yield the front buffer, which is not swapped until the block exits."""
+        with self._swap_lock:
+            self._drawn_version = self.version
+            yield self.buffers[self.front]
+        self._drawn.set()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
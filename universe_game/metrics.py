@@ -0,0 +1,92 @@
+import numpy as np
+
+from universe_game.neighbors import GRID_CHUNK_SIZE, cell_list, grid_candidate_pairs
+
+# Groups with fewer particles are treated as stragglers rather than clusters
+MIN_CLUSTER_SIZE = 5
+
+
+def centroid(positions):
+    """Return the (x, y) centre of mass of the particles."""
+    return positions[:, :2].mean(axis=0)
+
+
+def ring_radius(positions):
+    """
+    Return the mean distance of the particles from their centroid and its
+    relative spread. A thin ring has a small spread, a filled disk about 0.35.
+    """
+    distances = np.hypot(*(positions[:, :2] - centroid(positions)).T)
+    mean_distance = distances.mean()
+    spread = distances.std() / mean_distance if mean_distance > 0 else 0.0
+    return mean_distance, spread
+
+
+def radius_of_gyration(positions):
+    """Return the root mean square distance of the particles from their centroid."""
+    offsets = positions[:, :2] - centroid(positions)
+    return np.sqrt(np.mean(offsets[:, 0] ** 2 + offsets[:, 1] ** 2))
+
+
+def polarization(cos_vals, sin_vals):
+    """
+    Return the length of the mean heading vector of the particles, given the
+    components of their headings: 1 when all move alike, near 0 when disordered.
+    """
+    return np.hypot(cos_vals.mean(), sin_vals.mean())
+
+
+def cluster_labels(positions, link_distance):
+    """
+    Label the connected components of the graph linking particles at most
+    `link_distance` apart. Candidate pairs come from a cell list, and the
+    components are found by vectorised union-find with pointer jumping.
+    """
+    x, y = positions[:, 0], positions[:, 1]
+    n_particles = len(x)
+    labels = np.arange(n_particles)
+    if n_particles == 0 or link_distance <= 0:
+        return labels
+    cells = cell_list(x, y, link_distance)
+    rows = np.arange(n_particles)
+    for chunk_start in range(0, n_particles, GRID_CHUNK_SIZE):
+        chunk = rows[chunk_start : chunk_start + GRID_CHUNK_SIZE]
+        query, candidates = grid_candidate_pairs(chunk, *cells)
+        first = chunk[query]
+        linked = (first < candidates) & (
+            (x[first] - x[candidates]) ** 2 + (y[first] - y[candidates]) ** 2
+            <= link_distance**2
+        )
+        _union(labels, first[linked], candidates[linked])
+    return _find_roots(labels)
+
+
+def count_clusters(positions, link_distance, min_size=MIN_CLUSTER_SIZE):
+    """Return the number of clusters with at least `min_size` particles."""
+    sizes = np.bincount(cluster_labels(positions, link_distance))
+    return int(np.count_nonzero(sizes >= min_size))
+
+
+def _union(labels, first, second):
+    """Merge the components of every (first, second) pair, keeping the smaller root."""
+    while len(first):
+        roots = _find_roots(labels)
+        root_first, root_second = roots[first], roots[second]
+        np.minimum.at(
+            labels,
+            np.maximum(root_first, root_second),
+            np.minimum(root_first, root_second),
+        )
+        # A root linked to several others only keeps the smallest, so repeat
+        roots = _find_roots(labels)
+        unresolved = roots[first] != roots[second]
+        first, second = first[unresolved], second[unresolved]
+
+
+def _find_roots(labels):
+    """Point every label at the root of its tree, in place."""
+    while True:
+        parents = labels[labels]
+        if np.array_equal(parents, labels):
+            return labels
+        labels[:] = parents
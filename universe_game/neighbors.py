@@ -0,0 +1,406 @@
+import numpy as np
+import numexpr as ne
+
+
+TURN_KERNELS = ("bearing", "cross")
+GRID_CHUNK_SIZE = 1024
+GRID_CELL_PADDING = 1e-4
+# Number of listed pairs classified at once by `pair_turn_counts`
+PAIR_CHUNK_SIZE = 2**20
+# Half-width of the exactly checked band around each line, in machine epsilons of the cloud extent
+HALF_PLANE_MARGIN = 1e4
+
+
+def prepare_headings(angles, kernel="bearing", dtype=np.float64):
+    """
+    Return the per-particle headings used by `classify_pairs`.
+    The bearing kernel works on the angles in degrees, the cross kernel on
+    the (cos, sin) unit vectors of the headings.
+    """
+    if kernel == "bearing":
+        return angles.astype(dtype, copy=False)
+    if kernel == "cross":
+        return heading_vectors(angles, dtype)
+    raise ValueError(f"Unknown turn kernel {kernel!r}, expected one of {TURN_KERNELS}")
+
+
+def heading_vectors(angles, dtype=np.float64):
+    """
+    Return the cos and sin of the headings in degrees.
+    Headings on the axes and diagonals are snapped to exact values, so pairs
+    lying exactly on the heading line give a cross product of exactly 0, as
+    the bearing kernel gives a relative bearing of exactly 0.
+    """
+    radians = np.radians(angles)
+    cos_vals, sin_vals = np.cos(radians), np.sin(radians)
+    cos_vals[np.mod(angles, 180) == 90] = 0
+    sin_vals[np.mod(angles, 180) == 0] = 0
+    diagonal = np.mod(angles, 90) == 45
+    cos_vals[diagonal] = np.copysign(np.sqrt(0.5), cos_vals[diagonal])
+    sin_vals[diagonal] = np.copysign(np.sqrt(0.5), sin_vals[diagonal])
+    return cos_vals.astype(dtype), sin_vals.astype(dtype)
+
+
+def classify_pairs(dx, dy, distances_sq, radius_sq, headings):
+    """
+    Return the left and right masks for the given pairs.
+    With angle headings this uses the same expressions as the dense path so that
+    the counts are identical. With (cos, sin) headings the side is the sign of the
+    cross product between the heading and (dx, dy); a pair exactly behind the
+    heading counts as left, matching the wrap of the relative bearing to -180.
+    """
+    within_radius = ne.evaluate("(distances_sq < radius_sq) & (distances_sq > 0)")
+    if isinstance(headings, tuple):
+        cos_vals, sin_vals = headings
+        cross = ne.evaluate("cos_vals * dy - sin_vals * dx")
+        left_mask = ne.evaluate(
+            "within_radius & ((cross < 0) | ((cross == 0) & (cos_vals * dx + sin_vals * dy < 0)))"
+        )
+        right_mask = ne.evaluate("within_radius & (cross > 0)")
+        return left_mask, right_mask
+    angles = headings
+    bearings = ne.evaluate("arctan2(dy, dx)")
+    degrees_conversion_factor = 180 / np.pi
+    relative_bearings = ne.evaluate(
+        "bearings * degrees_conversion_factor - angles"
+    )
+    relative_bearings = ne.evaluate("(relative_bearings + 180) % 360 - 180")
+    left_mask = ne.evaluate("within_radius & (relative_bearings < 0)")
+    right_mask = ne.evaluate("within_radius & (relative_bearings > 0)")
+    return left_mask, right_mask
+
+
+def _take(headings, index):
+    """Index the headings, whichever representation they use."""
+    if isinstance(headings, tuple):
+        return tuple(component[index] for component in headings)
+    return headings[index]
+
+
+def dense_turn_counts(x, y, headings, radius_sq, rows, tile_size=None):
+    """
+    Count the left and right neighbours of `rows` against all particles.
+    The rows are processed in blocks of `tile_size`, so only the counters and
+    O(N * tile_size) temporaries are alive at any time.
+    """
+    if tile_size is None:
+        tile_size = len(rows)
+    tile_size = max(1, tile_size)
+    left_counter = np.empty(len(rows), dtype=np.int64)
+    right_counter = np.empty(len(rows), dtype=np.int64)
+    for tile_start in range(0, len(rows), tile_size):
+        tile = slice(tile_start, tile_start + tile_size)
+        x_rows = x[rows[tile], np.newaxis]
+        y_rows = y[rows[tile], np.newaxis]
+        dx = ne.evaluate("x_rows - x")
+        dy = ne.evaluate("y_rows - y")
+        distances_sq = ne.evaluate("dx**2 + dy**2")
+        left_mask, right_mask = classify_pairs(
+            dx,
+            dy,
+            distances_sq,
+            radius_sq[rows[tile], np.newaxis],
+            _take(headings, (rows[tile], np.newaxis)),
+        )
+        left_counter[tile] = left_mask.sum(axis=1)
+        right_counter[tile] = right_mask.sum(axis=1)
+    return left_counter, right_counter
+
+
+def cell_list(x, y, cell_size):
+    """
+    Bin the particles into square cells of side `cell_size`, padded slightly
+    so that rounding never places two particles `cell_size` apart more than
+    one cell apart. Returns (cell_x, cell_y, n_cells_x, n_cells_y, sorted_keys,
+    order), where `order` sorts the particles by the keys of their cells, as
+    used by `grid_candidate_pairs`.
+    """
+    cell_size = cell_size * (1 + GRID_CELL_PADDING)
+    x = x.astype(np.float64, copy=False)
+    y = y.astype(np.float64, copy=False)
+    cell_x = np.floor((x - x.min()) / cell_size).astype(np.int64)
+    cell_y = np.floor((y - y.min()) / cell_size).astype(np.int64)
+    n_cells_x = cell_x.max() + 1
+    n_cells_y = cell_y.max() + 1
+    cell_keys = cell_x + cell_y * n_cells_x
+    order = np.argsort(cell_keys, kind="stable")
+    return cell_x, cell_y, n_cells_x, n_cells_y, cell_keys[order], order
+
+
+def grid_turn_counts(x, y, headings, radius_sq, rows, cell_size):
+    """
+    Count the left and right neighbours of `rows` using a uniform cell list.
+    Particles are binned into square cells of side `cell_size` by `cell_list`,
+    so every row whose radius is at most `cell_size` only needs to look at the
+    3x3 block of cells around it.
+    """
+    cells = cell_list(x, y, cell_size)
+    left_counter = np.zeros(len(rows), dtype=np.int64)
+    right_counter = np.zeros(len(rows), dtype=np.int64)
+    for chunk_start in range(0, len(rows), GRID_CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + GRID_CHUNK_SIZE)
+        query, candidates = grid_candidate_pairs(rows[chunk], *cells)
+        left_counter[chunk], right_counter[chunk] = _count_pairs(
+            x, y, headings, radius_sq, rows[chunk], query, candidates
+        )
+    return left_counter, right_counter
+
+
+def neighbor_pairs(x, y, cutoff):
+    """
+    Return the (first, second) indices of every ordered pair of distinct
+    particles at most `cutoff` apart, found with a cell list of cell size
+    `cutoff`. The cutoff is padded like the grid cells, so no pair is lost
+    to rounding.
+    """
+    cells = cell_list(x, y, cutoff)
+    cutoff = cutoff * (1 + GRID_CELL_PADDING)
+    x_cells = x.astype(np.float64, copy=False)
+    y_cells = y.astype(np.float64, copy=False)
+    rows = np.arange(len(x))
+    first, second = [], []
+    for chunk_start in range(0, len(rows), GRID_CHUNK_SIZE):
+        chunk = rows[chunk_start : chunk_start + GRID_CHUNK_SIZE]
+        query, candidates = grid_candidate_pairs(chunk, *cells)
+        i = chunk[query]
+        dx = x_cells[i] - x_cells[candidates]
+        dy = y_cells[i] - y_cells[candidates]
+        close = (i != candidates) & (dx**2 + dy**2 <= cutoff**2)
+        first.append(i[close])
+        second.append(candidates[close])
+    return np.concatenate(first), np.concatenate(second)
+
+
+def pair_turn_counts(x, y, headings, radius_sq, first, second, n_particles):
+    """
+    Count the left and right neighbours of every particle among the listed
+    (first, second) pairs, classifying the pairs in chunks of PAIR_CHUNK_SIZE.
+    """
+    rows = np.arange(n_particles)
+    left_counter = np.zeros(n_particles, dtype=np.int64)
+    right_counter = np.zeros(n_particles, dtype=np.int64)
+    for chunk_start in range(0, len(first), PAIR_CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + PAIR_CHUNK_SIZE)
+        left, right = _count_pairs(
+            x, y, headings, radius_sq, rows, first[chunk], second[chunk]
+        )
+        left_counter += left
+        right_counter += right
+    return left_counter, right_counter
+
+
+def global_turn_counts(x, y, headings, radius_sq, rows):
+    """
+    Count the left and right neighbours of global-radius `rows` by half-plane counting.
+    A row whose radius covers the whole cloud only needs to know how many particles
+    lie on each side of the line through it along its heading. Particles are split
+    into equal-count strips sorted along the line, so each strip contributes two
+    binary searches and only the particles close to the line get an exact check.
+    Returns the counters and a mask of the covered rows; the remaining rows must
+    be counted with an exact dense scan.
+    """
+    x_min, x_max = x.min(), x.max()
+    y_min, y_max = y.min(), y.max()
+    x_rows, y_rows = x[rows], y[rows]
+    farthest_sq = np.maximum((x_rows - x_min) ** 2, (x_max - x_rows) ** 2)
+    farthest_sq += np.maximum((y_rows - y_min) ** 2, (y_max - y_rows) ** 2)
+    covered = farthest_sq < radius_sq[rows]
+
+    left_counter = np.zeros(len(rows), dtype=np.int64)
+    right_counter = np.zeros(len(rows), dtype=np.int64)
+    if isinstance(headings, tuple):
+        cos_vals, sin_vals = (
+            component[rows].astype(np.float64) for component in headings
+        )
+    else:
+        radians = np.radians(headings[rows])
+        cos_vals, sin_vals = np.cos(radians), np.sin(radians)
+    # Particles this close to the line are checked exactly, covering rounding errors
+    margin = HALF_PLANE_MARGIN * np.finfo(x.dtype).eps
+    margin *= (x_max - x_min) + (y_max - y_min)
+    shallow = np.abs(cos_vals) >= np.abs(sin_vals)
+    orientations = [
+        # Lines closer to horizontal: strips along x, particles sorted by y
+        (covered & shallow, x, y, sin_vals, cos_vals, cos_vals > 0),
+        # Lines closer to vertical: strips along y, particles sorted by x
+        (covered & ~shallow, y, x, cos_vals, sin_vals, sin_vals < 0),
+    ]
+    for mask, u, v, rise, run, above_is_left in orientations:
+        selected = np.flatnonzero(mask)
+        if len(selected) == 0:
+            continue
+        strips = _build_strips(u, v)
+        for chunk_start in range(0, len(selected), GRID_CHUNK_SIZE):
+            chunk = selected[chunk_start : chunk_start + GRID_CHUNK_SIZE]
+            slopes = rise[chunk] / run[chunk]
+            below, above, band_left, band_right = _strip_half_plane_counts(
+                strips, x, y, headings, radius_sq, rows[chunk], slopes, margin
+            )
+            left_counter[chunk] = np.where(above_is_left[chunk], above, below)
+            right_counter[chunk] = np.where(above_is_left[chunk], below, above)
+            left_counter[chunk] += band_left
+            right_counter[chunk] += band_right
+    return left_counter, right_counter, covered
+
+
+def exact_global_turn_counts(x, y, headings, radius_sq, rows, tile_size=None):
+    """
+    Count the neighbours of global-radius `rows` with `global_turn_counts`,
+    scanning the rows it does not cover with `dense_turn_counts`.
+    """
+    left_counter, right_counter, covered = global_turn_counts(
+        x, y, headings, radius_sq, rows
+    )
+    uncovered = np.flatnonzero(~covered)
+    if len(uncovered):
+        left_counter[uncovered], right_counter[uncovered] = dense_turn_counts(
+            x, y, headings, radius_sq, rows[uncovered], tile_size=tile_size
+        )
+    return left_counter, right_counter
+
+
+def domain_turn_counts(
+    x, y, headings, radius_sq, radius, domain, n_domains, bounds, tile_size=None
+):
+    """
+    Count the neighbours of the rows owned by `domain`, one of `n_domains`
+    equal-width strips along x between `bounds` (particles outside them
+    belong to the outer strips). A domain owns the local-radius particles in
+    its strip, which only need the particles of the strip and of a halo of
+    width `radius` around it, and every n_domains-th global-radius particle,
+    which needs the whole cloud: each domain sorts all the particles into its
+    own half-plane strips for them, nothing is shared between the domains.
+    Every row belongs to exactly one domain, so together the domains give the
+    same counts as a single process. Returns the owned rows and their left and right counts.
+    """
+    low, high = bounds
+    width = (high - low) / n_domains
+    if width > 0:
+        strips = np.clip(np.floor((x - low) / width), 0, n_domains - 1)
+    else:
+        strips = np.zeros(len(x))
+    local = radius_sq <= radius**2
+    local_rows = np.flatnonzero(local & (strips == domain))
+    global_rows = np.flatnonzero(~local)[domain::n_domains]
+    rows = np.concatenate([local_rows, global_rows])
+    left_counter = np.zeros(len(rows), dtype=np.int64)
+    right_counter = np.zeros(len(rows), dtype=np.int64)
+    if len(local_rows) and radius > 0:
+        reach = radius * (1 + GRID_CELL_PADDING)
+        strip_low = low + domain * width
+        strip_high = strip_low + width
+        members = np.flatnonzero(
+            (strips == domain) | ((x >= strip_low - reach) & (x <= strip_high + reach))
+        )
+        (
+            left_counter[: len(local_rows)],
+            right_counter[: len(local_rows)],
+        ) = grid_turn_counts(
+            x[members],
+            y[members],
+            _take(headings, members),
+            radius_sq[members],
+            np.searchsorted(members, local_rows),
+            cell_size=radius,
+        )
+    if len(global_rows):
+        (
+            left_counter[len(local_rows) :],
+            right_counter[len(local_rows) :],
+        ) = exact_global_turn_counts(
+            x, y, headings, radius_sq, global_rows, tile_size=tile_size
+        )
+    return rows, left_counter, right_counter
+
+
+def _build_strips(u, v):
+    """Split the particles into equal-count strips along `u`, each sorted by `v`."""
+    n_particles = len(u)
+    n_strips = max(1, int(np.sqrt(n_particles)))
+    bounds = np.linspace(0, n_particles, n_strips + 1).astype(np.int64)
+    bounds = np.unique(bounds)
+    order = np.argsort(u, kind="stable")
+    members = np.empty(n_particles, dtype=np.int64)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        strip = order[start:stop]
+        members[start:stop] = strip[np.argsort(v[strip], kind="stable")]
+    u_low = u[order[bounds[:-1]]]
+    u_high = u[order[bounds[1:] - 1]]
+    return u, v, bounds, members, v[members], u_low, u_high
+
+
+def _strip_half_plane_counts(strips, x, y, headings, radius_sq, rows, slopes, margin):
+    """
+    Count the particles strictly above and below each row's line, plus the exact
+    left/right counts of the particles in the band around the line.
+    """
+    u, v, bounds, members, sorted_v, u_low, u_high = strips
+    u_rows, v_rows = u[rows], v[rows]
+    n_below = np.zeros(len(rows), dtype=np.int64)
+    n_above = np.zeros(len(rows), dtype=np.int64)
+    band_starts, band_counts = [], []
+    for k, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        line_low = v_rows + slopes * (u_low[k] - u_rows)
+        line_high = v_rows + slopes * (u_high[k] - u_rows)
+        lower = np.minimum(line_low, line_high) - margin
+        upper = np.maximum(line_low, line_high) + margin
+        below = np.searchsorted(sorted_v[start:stop], lower, side="left")
+        above = np.searchsorted(sorted_v[start:stop], upper, side="right")
+        n_below += below
+        n_above += stop - start - above
+        band_starts.append(start + below)
+        band_counts.append(above - below)
+    band_starts = np.concatenate(band_starts)
+    band_counts = np.concatenate(band_counts)
+    query = np.repeat(np.tile(np.arange(len(rows)), len(bounds) - 1), band_counts)
+    run_offsets = np.repeat(np.cumsum(band_counts) - band_counts, band_counts)
+    positions = np.repeat(band_starts, band_counts) + np.arange(len(query))
+    candidates = members[positions - run_offsets]
+    band_left, band_right = _count_pairs(
+        x, y, headings, radius_sq, rows, query, candidates
+    )
+    return n_below, n_above, band_left, band_right
+
+
+def _count_pairs(x, y, headings, radius_sq, rows, query, candidates):
+    """Classify the (rows[query], candidates) pairs and count them per row."""
+    i = rows[query]
+    x_i, x_j = x[i], x[candidates]
+    y_i, y_j = y[i], y[candidates]
+    dx = ne.evaluate("x_i - x_j")
+    dy = ne.evaluate("y_i - y_j")
+    distances_sq = ne.evaluate("dx**2 + dy**2")
+    left_mask, right_mask = classify_pairs(
+        dx, dy, distances_sq, radius_sq[i], _take(headings, i)
+    )
+    left_counter = np.bincount(query[left_mask], minlength=len(rows))
+    right_counter = np.bincount(query[right_mask], minlength=len(rows))
+    return left_counter, right_counter
+
+
+def grid_candidate_pairs(rows, cell_x, cell_y, n_cells_x, n_cells_y, keys, order):
+    """Return (query, candidate) index pairs for every particle in the 3x3 neighbouring cells."""
+    starts, counts = [], []
+    for offset_x in (-1, 0, 1):
+        for offset_y in (-1, 0, 1):
+            neighbour_x = cell_x[rows] + offset_x
+            neighbour_y = cell_y[rows] + offset_y
+            valid = (
+                (neighbour_x >= 0)
+                & (neighbour_x < n_cells_x)
+                & (neighbour_y >= 0)
+                & (neighbour_y < n_cells_y)
+            )
+            neighbour_keys = neighbour_x + neighbour_y * n_cells_x
+            start = np.searchsorted(keys, neighbour_keys, side="left")
+            stop = np.searchsorted(keys, neighbour_keys, side="right")
+            starts.append(start)
+            counts.append(np.where(valid, stop - start, 0))
+    starts = np.concatenate(starts)
+    counts = np.concatenate(counts)
+    query = np.tile(np.arange(len(rows)), 9)
+    query = np.repeat(query, counts)
+    # Position of each pair inside the run of its neighbouring cell
+    run_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(starts, counts) + np.arange(len(query)) - run_offsets
+    return query, order[positions]
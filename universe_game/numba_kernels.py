@@ -0,0 +1,88 @@
+import numpy as np
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def set_num_threads(n_threads):
+    """Limit the number of threads used by the numba kernels."""
+    if NUMBA_AVAILABLE and n_threads is not None:
+        numba.set_num_threads(min(n_threads, numba.config.NUMBA_NUM_THREADS))
+
+
+def fused_turn_counts(x, y, headings, radius_sq):
+    """
+    Count the left and right neighbours of every particle in a single pass over
+    the pairs, parallelised over particles, so no N x N temporaries are
+    allocated. `headings` come from neighbors.prepare_headings: angles are
+    classified with the same relative bearings as the dense path, (cos, sin)
+    vectors with the cross product, see neighbors.classify_pairs.
+    """
+    left_counter = np.empty(len(x), dtype=np.int64)
+    right_counter = np.empty(len(x), dtype=np.int64)
+    if isinstance(headings, tuple):
+        cos_vals, sin_vals = headings
+        _fused_cross_counts(
+            x, y, cos_vals, sin_vals, radius_sq, left_counter, right_counter
+        )
+    else:
+        _fused_bearing_counts(x, y, headings, radius_sq, left_counter, right_counter)
+    return left_counter, right_counter
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, cache=True)
+    def _fused_cross_counts(x, y, cos_vals, sin_vals, radius_sq, left_out, right_out):
+        n_particles = x.shape[0]
+        for i in prange(n_particles):
+            left = 0
+            right = 0
+            for j in range(n_particles):
+                dx = x[i] - x[j]
+                dy = y[i] - y[j]
+                distance_sq = dx * dx + dy * dy
+                if not (distance_sq < radius_sq[i] and distance_sq > 0):
+                    continue
+                cross = cos_vals[i] * dy - sin_vals[i] * dx
+                if cross > 0:
+                    right += 1
+                elif cross < 0:
+                    left += 1
+                elif cos_vals[i] * dx + sin_vals[i] * dy < 0:
+                    left += 1
+            left_out[i] = left
+            right_out[i] = right
+
+    @njit(parallel=True, cache=True)
+    def _fused_bearing_counts(x, y, angles, radius_sq, left_out, right_out):
+        degrees_conversion_factor = 180 / np.pi
+        n_particles = x.shape[0]
+        for i in prange(n_particles):
+            left = 0
+            right = 0
+            for j in range(n_particles):
+                dx = x[i] - x[j]
+                dy = y[i] - y[j]
+                distance_sq = dx * dx + dy * dy
+                if not (distance_sq < radius_sq[i] and distance_sq > 0):
+                    continue
+                # The operations of classify_pairs, in the same order, with
+                # numexpr's floored modulo, so the bearings round identically
+                relative_bearing = (
+                    np.float64(np.arctan2(dy, dx)) * degrees_conversion_factor
+                    - np.float64(angles[i])
+                )
+                shifted = relative_bearing + 180
+                relative_bearing = shifted - np.floor(shifted / 360) * 360 - 180
+                if relative_bearing < 0:
+                    left += 1
+                elif relative_bearing > 0:
+                    right += 1
+            left_out[i] = left
+            right_out[i] = right
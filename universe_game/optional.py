@@ -0,0 +1,34 @@
+import importlib
+import importlib.util
+
+# Extra of the package that installs each optional dependency
+OPTIONAL_EXTRAS = {
+    "pygame": "pygame",
+    "matplotlib": "matplotlib",
+    "cv2": "opencv",
+    "moviepy": "moviepy",
+    "numba": "jit",
+    "pyarrow": "parquet",
+    "PIL": "gif",
+}
+
+
+def is_available(module):
+    """Whether `module` can be imported, without importing it."""
+    return importlib.util.find_spec(module.partition(".")[0]) is not None
+
+
+def require(module):
+    """
+    Import and return the optional `module`, raising an ImportError that names
+    the extra installing it when it is missing.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as error:
+        package = module.partition(".")[0]
+        extra = OPTIONAL_EXTRAS.get(package, package)
+        raise ImportError(
+            f"{package} is not installed, install it with "
+            f"pip install 'particles-universe[{extra}]'"
+        ) from error
@@ -0,0 +1,109 @@
+import csv
+import json
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+import numpy as np
+
+# Number of most recent samples per phase kept for the statistics
+PROFILE_WINDOW = 600
+SUMMARY_FIELDS = ["count", "total", "mean", "median", "p95", "max"]
+
+
+class StepProfiler:
+    """
+    Record the wall time of the phases of every step and frame, e.g.
+    with profiler.phase("move"): ...
+    The statistics and histograms are computed over a rolling window of the
+    last `window` samples of each phase, while the count and total cover the
+    whole run. Times are in seconds.
+    """
+
+    enabled = True
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+        self.totals = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def record(self, name, duration):
+        """Add one sample of `duration` seconds to the phase."""
+        if name not in self.samples:
+            self.samples[name] = np.zeros(self.window)
+            self.counts[name] = 0
+            self.totals[name] = 0.0
+        self.samples[name][self.counts[name] % self.window] = duration
+        self.counts[name] += 1
+        self.totals[name] += duration
+
+    def recent(self, name):
+        """The samples of the phase in the rolling window, in no particular order."""
+        return self.samples[name][: min(self.counts[name], self.window)]
+
+    def histogram(self, name, bins=20):
+        """Return the (counts, edges) histogram of the recent samples of the phase."""
+        return np.histogram(self.recent(name), bins=bins)
+
+    def summary(self):
+        """Return {phase: {count, total, mean, median, p95, max}}."""
+        summary = {}
+        for name in self.samples:
+            recent = self.recent(name)
+            summary[name] = {
+                "count": self.counts[name],
+                "total": self.totals[name],
+                "mean": float(recent.mean()),
+                "median": float(np.median(recent)),
+                "p95": float(np.percentile(recent, 95)),
+                "max": float(recent.max()),
+            }
+        return summary
+
+    def overlay_lines(self):
+        """One "phase: mean ms" line per phase, slowest first, for on-screen display."""
+        means = {name: self.recent(name).mean() for name in self.samples}
+        return [
+            f"{name}: {mean * 1e3:.2f} ms"
+            for name, mean in sorted(means.items(), key=lambda item: -item[1])
+        ]
+
+    def export(self, filename):
+        """Write the summary to a .csv file, or a .json file including the histograms."""
+        summary = self.summary()
+        if filename.endswith(".csv"):
+            with open(filename, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(["phase"] + SUMMARY_FIELDS)
+                for name, stats in summary.items():
+                    writer.writerow([name] + [stats[field] for field in SUMMARY_FIELDS])
+            return
+        for name, stats in summary.items():
+            counts, edges = self.histogram(name)
+            stats["histogram"] = {"counts": counts.tolist(), "edges": edges.tolist()}
+        with open(filename, "w") as file:
+            json.dump({"window": self.window, "phases": summary}, file, indent=3)
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off, so the instrumented code stays branch-free."""
+
+    enabled = False
+    _null_phase = nullcontext()
+
+    def phase(self, name):
+        return self._null_phase
+
+    def record(self, name, duration):
+        pass
+
+    def overlay_lines(self):
+        return []
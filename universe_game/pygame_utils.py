@@ -1,11 +1,50 @@
+from functools import lru_cache
+from itertools import repeat
+
 import numpy as np
 
+# Outlines larger than this are drawn directly instead of blitted as sprites
+MAX_SPRITE_RADIUS = 64
+# Above this many particles the viewport is estimated from an evenly strided sample
+VIEWPORT_SAMPLES = 2**16
+# Particles per pixel at which the density field is fully opaque
+DENSITY_SATURATION = 32
+# Opacity of a pixel holding a single particle
+DENSITY_MIN_LEVEL = 96
+# Opacity of a pixel holding k particles, rising on a log scale
+DENSITY_LEVELS = np.concatenate(
+    [
+        [0],
+        np.rint(
+            DENSITY_MIN_LEVEL
+            + (255 - DENSITY_MIN_LEVEL)
+            * np.log(np.arange(1, DENSITY_SATURATION + 1))
+            / np.log(DENSITY_SATURATION)
+        ),
+    ]
+).astype(np.uint8)
+
+
+def percentile_bounds(values, low=3, high=97, max_samples=VIEWPORT_SAMPLES):
+    """
+    Return the `low` and `high` percentiles of values, interpolated like
+    np.percentile, from a single linear-time partition. Above `max_samples`
+    values they are estimated from an evenly strided sample instead.
+    """
+    if len(values) > max_samples:
+        values = values[:: -(-len(values) // max_samples)]
+    positions = np.array([low, high]) / 100 * (len(values) - 1)
+    below = np.floor(positions).astype(np.intp)
+    above = np.minimum(below + 1, len(values) - 1)
+    partitioned = np.partition(values, np.union1d(below, above))
+    fraction = positions - below
+    return partitioned[below] + fraction * (partitioned[above] - partitioned[below])
+
+
 def compute_dynamic_scale_and_offset(particles, target_dim, padding=0.0):
     """Compute scale and offset to fit the particles within the target dimensions."""
-    min_x = np.percentile(particles[:, 0], 3)
-    min_y = np.percentile(particles[:, 1], 3)
-    max_x = np.percentile(particles[:, 0], 97)
-    max_y = np.percentile(particles[:, 1], 97)
+    min_x, max_x = percentile_bounds(particles[:, 0])
+    min_y, max_y = percentile_bounds(particles[:, 1])
 
     padding = padding * (max(max_x - min_x, max_y - min_y))
     min_x -= padding
@@ -24,3 +63,51 @@ def compute_dynamic_scale_and_offset(particles, target_dim, padding=0.0):
 def lerp(a, b, t=0.05):
     """Linearly interpolate between a and b."""
     return a + t * (b - a)
+
+
+@lru_cache(maxsize=32)
+def _cached_circle_sprite(radius, width, color):
+    import pygame
+
+    # An opaque colour-keyed sprite blits much faster than a per-pixel alpha one
+    size = 2 * radius + 1
+    transparent = (255, 0, 255) if color != (255, 0, 255) else (0, 255, 0)
+    sprite = pygame.Surface((size, size))
+    sprite.fill(transparent)
+    pygame.draw.circle(sprite, color, (radius, radius), radius, width)
+    sprite.set_colorkey(transparent, pygame.RLEACCEL)
+    return sprite
+
+
+def circle_sprite(radius, width=0, color=(0, 0, 0)):
+    """Return a cached, pre-rendered circle with the given radius in pixels."""
+    return _cached_circle_sprite(max(int(round(radius)), 1), width, color)
+
+
+def stamp_sprites(surface, coords, sprite):
+    """Blit the sprite centred on every (x, y) in coords that is visible on the surface."""
+    sprite_width, sprite_height = sprite.get_size()
+    top_left = np.rint(coords).astype(np.int64) - (sprite_width // 2, sprite_height // 2)
+    surface_width, surface_height = surface.get_size()
+    visible = (
+        (top_left[:, 0] > -sprite_width)
+        & (top_left[:, 0] < surface_width)
+        & (top_left[:, 1] > -sprite_height)
+        & (top_left[:, 1] < surface_height)
+    )
+    surface.blits(zip(repeat(sprite), top_left[visible].tolist()), doreturn=False)
+
+
+def density_levels(coords, size):
+    """
+    Bin the (x, y) pixel coordinates into a (width, height) uint8 image of
+    opacities, one per pixel, see DENSITY_LEVELS. Coordinates outside the
+    image are dropped.
+    """
+    width, height = size
+    x, y = coords[:, 0], coords[:, 1]
+    visible = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    pixels = x[visible].astype(np.intp) * height + y[visible].astype(np.intp)
+    counts = np.bincount(pixels, minlength=width * height)
+    np.minimum(counts, DENSITY_SATURATION, out=counts)
+    return DENSITY_LEVELS[counts].reshape(width, height)
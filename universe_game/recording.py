@@ -0,0 +1,131 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from universe_game.optional import require
+
+RAW_MAGIC = b"UNIVRAW1"
+RAW_HEADER_SIZE = 4096
+
+
+class FrameRecorder:
+    """
+    Record RGB frames to a video without stalling the render loop.
+    Frames are copied into a preallocated ring buffer of `capacity` slots and
+    encoded on a worker thread. When every slot is waiting to be encoded,
+    `write` blocks until one is free, which bounds the memory used. With
+    raw=True the frames are written to disk unencoded, to be turned into a
+    video later with `encode_raw_frames`.
+    """
+
+    def __init__(self, filename, frame_size, fps=60, capacity=32, raw=False):
+        self.filename = filename
+        self.width, self.height = frame_size
+        self.fps = fps
+        self.raw = raw
+        self.n_frames = 0
+        self._slots = np.empty((capacity, self.height, self.width, 3), dtype=np.uint8)
+        self._free = queue.Queue()
+        for index in range(capacity):
+            self._free.put(index)
+        self._pending = queue.Queue()
+        self._error = None
+        self._sink = self._open_raw() if raw else _open_video_writer(
+            filename, frame_size, fps
+        )
+        self._worker = threading.Thread(target=self._encode_frames, daemon=True)
+        self._worker.start()
+
+    def write(self, frame):
+        """Queue an RGB frame of shape (height, width, 3) for encoding."""
+        if self._error is not None:
+            raise self._error
+        if frame.shape[:2] != (self.height, self.width):
+            frame = _resize(frame, (self.width, self.height))
+        index = self._free.get()
+        self._slots[index] = frame
+        self._pending.put(index)
+        self.n_frames += 1
+
+    def close(self):
+        """Encode the queued frames and close the output."""
+        self._pending.put(None)
+        self._worker.join()
+        if self.raw:
+            self._sink.close()
+        else:
+            self._sink.release()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _encode_frames(self):
+        while True:
+            index = self._pending.get()
+            if index is None:
+                return
+            try:
+                if self._error is None:
+                    self._write_slot(self._slots[index])
+            except Exception as error:
+                self._error = error
+            self._free.put(index)
+
+    def _write_slot(self, frame):
+        if self.raw:
+            self._sink.write(frame.tobytes())
+        else:
+            cv2 = require("cv2")
+            self._sink.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+    def _open_raw(self):
+        header = {"width": self.width, "height": self.height, "fps": self.fps}
+        file = open(self.filename, "wb")
+        file.write((RAW_MAGIC + json.dumps(header).encode()).ljust(RAW_HEADER_SIZE, b"\0"))
+        return file
+
+
+def read_raw_frames(filename):
+    """Memory-map a raw recording, returning the (n_frames, height, width, 3) frames and fps."""
+    with open(filename, "rb") as file:
+        raw_header = file.read(RAW_HEADER_SIZE)
+    if not raw_header.startswith(RAW_MAGIC):
+        raise ValueError(f"{filename} is not a raw frame recording.")
+    header = json.loads(raw_header[len(RAW_MAGIC) :].rstrip(b"\0"))
+    frame_bytes = header["width"] * header["height"] * 3
+    n_frames = (os.path.getsize(filename) - RAW_HEADER_SIZE) // frame_bytes
+    frames = np.memmap(
+        filename,
+        dtype=np.uint8,
+        mode="r",
+        offset=RAW_HEADER_SIZE,
+        shape=(n_frames, header["height"], header["width"], 3),
+    )
+    return frames, header["fps"]
+
+
+def encode_raw_frames(raw_filename, filename, fps=None):
+    """Encode a raw recording written with FrameRecorder(raw=True) into a video."""
+    frames, raw_fps = read_raw_frames(raw_filename)
+    with FrameRecorder(filename, (frames.shape[2], frames.shape[1]), fps or raw_fps) as recorder:
+        for frame in frames:
+            recorder.write(frame)
+
+
+def _open_video_writer(filename, frame_size, fps):
+    cv2 = require("cv2")
+    fourcc = cv2.VideoWriter_fourcc(*"XVID")
+    return cv2.VideoWriter(filename, fourcc, float(fps), frame_size)
+
+
+def _resize(frame, frame_size):
+    cv2 = require("cv2")
+    return cv2.resize(np.ascontiguousarray(frame), frame_size)
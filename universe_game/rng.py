@@ -0,0 +1,24 @@
+import numpy as np
+
+# Independent random streams of a ParticleManager, in spawn order
+RANDOM_STREAMS = ("initial_positions", "global_radius", "random_turns")
+
+
+def seed_sequence(seed=None):
+    """Return `seed` as a SeedSequence; None draws fresh entropy from the OS."""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def spawn_seeds(seed, n):
+    """Spawn `n` independent child seed sequences, e.g. one per worker or universe."""
+    return seed_sequence(seed).spawn(n)
+
+
+def spawn_generators(seed, names=RANDOM_STREAMS):
+    """Return a dict of independent Generators, one per name, spawned from `seed`."""
+    return {
+        name: np.random.default_rng(child)
+        for name, child in zip(names, spawn_seeds(seed, len(names)))
+    }
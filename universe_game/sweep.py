@@ -0,0 +1,125 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from universe_game.managers.particle import ParticleManager
+from universe_game.metrics import centroid, count_clusters, ring_radius
+
+SWEEP_CACHE_DIR = ".sweep_cache"
+# Bump when a change to the simulation invalidates the cached results
+SWEEP_CACHE_VERSION = 1
+
+
+def expand_grid(base_conds, grid):
+    """
+    Return one conds dict per combination of the values in `grid`, a dict
+    mapping a conds key to the list of values to try, applied on top of
+    `base_conds`.
+    """
+    keys = list(grid)
+    return [
+        {**base_conds, **dict(zip(keys, values))}
+        for values in itertools.product(*(grid[key] for key in keys))
+    ]
+
+
+def point_key(conds, seed, steps, record_every):
+    """Hash identifying a sweep point in the cache."""
+    point = {
+        "version": SWEEP_CACHE_VERSION,
+        "conds": conds,
+        "seed": seed,
+        "steps": steps,
+        "record_every": record_every,
+    }
+    encoded = json.dumps(point, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def run_point(conds, seed, steps, record_every=10):
+    """
+    Run one simulation headless and summarise its final state.
+    Returns the number of clusters (particles linked within `radius`), the
+    radius and relative spread of the cloud around its centroid, and the mean
+    speed of the centroid per step.
+    """
+    pm = ParticleManager(**{**conds, "seed": seed})
+    centroids = [centroid(pm.particle_pos)]
+    for _, positions in pm.stream(steps, record_every):
+        centroids.append(centroid(positions))
+    displacements = np.diff(np.array(centroids), axis=0)
+    centroid_speed = (
+        np.hypot(*displacements.T).mean() / record_every if len(displacements) else 0.0
+    )
+    radius, spread = ring_radius(pm.particle_pos)
+    return {
+        "clusters": count_clusters(pm.particle_pos, pm.radius),
+        "ring_radius": float(radius),
+        "ring_spread": float(spread),
+        "centroid_speed": float(centroid_speed),
+    }
+
+
+def run_sweep(
+    conds_list,
+    steps,
+    seeds=(0,),
+    record_every=10,
+    n_workers=None,
+    cache_dir=SWEEP_CACHE_DIR,
+):
+    """
+    Run every conds dict with every seed in a process pool and return one
+    {"conds", "seed", "metrics"} dict per point, in order.
+    Finished points are cached in `cache_dir` as they complete, so rerunning
+    a sweep, or resuming an interrupted one, only computes the missing points.
+    """
+    points = [(conds, seed) for conds in conds_list for seed in seeds]
+    keys = [point_key(conds, seed, steps, record_every) for conds, seed in points]
+    metrics = {}
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for key in keys:
+            cached = _read_cached(cache_dir, key)
+            if cached is not None:
+                metrics[key] = cached
+    missing = {
+        key: point for key, point in zip(keys, points) if key not in metrics
+    }
+    if missing:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(run_point, conds, seed, steps, record_every): key
+                for key, (conds, seed) in missing.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                metrics[key] = future.result()
+                if cache_dir is not None:
+                    conds, seed = missing[key]
+                    _write_cached(cache_dir, key, conds, seed, metrics[key])
+    return [
+        {"conds": conds, "seed": seed, "metrics": metrics[key]}
+        for key, (conds, seed) in zip(keys, points)
+    ]
+
+
+def _read_cached(cache_dir, key):
+    try:
+        with open(os.path.join(cache_dir, f"{key}.json")) as file:
+            return json.load(file)["metrics"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def _write_cached(cache_dir, key, conds, seed, metrics):
+    # Write to a temporary file first, so an interrupted sweep never leaves a
+    # truncated entry behind
+    filename = os.path.join(cache_dir, f"{key}.json")
+    with open(f"{filename}.tmp", "w") as file:
+        json.dump({"conds": conds, "seed": seed, "metrics": metrics}, file, default=str)
+    os.replace(f"{filename}.tmp", filename)
@@ -0,0 +1,126 @@
+import json
+import os
+
+import numpy as np
+
+MAGIC = b"UNIVTRAJ"
+HEADER_SIZE = 4096
+
+
+class TrajectoryWriter:
+    """
+    Append-only on-disk store of particle positions (x, y, angle) over time.
+    The file starts with a fixed-size header holding the initial conditions,
+    dtype, number of particles and number of recorded frames, followed by the
+    frames as a raw (n_frames, n_particles, 3) array.
+    """
+
+    def __init__(self, filename, n_particles, conds=None, dtype="float64", record_every=1):
+        self.filename = filename
+        self.n_particles = n_particles
+        self.conds = conds or {}
+        self.dtype = np.dtype(dtype)
+        self.record_every = record_every
+        self.n_frames = 0
+        self._file = open(filename, "wb")
+        self._write_header()
+
+    def append(self, positions):
+        """Append one (n_particles, 3) frame."""
+        frame = np.ascontiguousarray(positions, dtype=self.dtype)
+        if frame.shape != (self.n_particles, 3):
+            raise ValueError(
+                f"Expected a frame of shape {(self.n_particles, 3)}, got {frame.shape}"
+            )
+        self._file.write(frame.tobytes())
+        self.n_frames += 1
+
+    def flush(self):
+        """Write the current frame count to the header and flush to disk."""
+        self._write_header()
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_header(self):
+        header = {
+            "conds": self.conds,
+            "dtype": self.dtype.str,
+            "n_particles": self.n_particles,
+            "n_frames": self.n_frames,
+            "record_every": self.record_every,
+        }
+        encoded = MAGIC + json.dumps(header, default=str).encode()
+        if len(encoded) > HEADER_SIZE:
+            raise ValueError("The trajectory header does not fit in HEADER_SIZE bytes.")
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(encoded.ljust(HEADER_SIZE, b"\0"))
+        self._file.seek(max(position, HEADER_SIZE))
+
+
+class TrajectoryReader:
+    """
+    Read-only, memory-mapped view of a file written by TrajectoryWriter.
+    Frames are only loaded from disk when accessed, so any frame of an
+    arbitrarily long run can be read in constant memory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as file:
+            raw_header = file.read(HEADER_SIZE)
+        if not raw_header.startswith(MAGIC):
+            raise ValueError(f"{filename} is not a trajectory file.")
+        header = json.loads(raw_header[len(MAGIC) :].rstrip(b"\0"))
+        self.conds = header["conds"]
+        self.dtype = np.dtype(header["dtype"])
+        self.n_particles = header["n_particles"]
+        self.record_every = header["record_every"]
+        # Trust the file size over the header, so runs that were interrupted
+        # before the final header update can still be replayed
+        frame_bytes = self.n_particles * 3 * self.dtype.itemsize
+        n_frames = (os.path.getsize(filename) - HEADER_SIZE) // frame_bytes
+        self.frames = np.memmap(
+            filename,
+            dtype=self.dtype,
+            mode="r",
+            offset=HEADER_SIZE,
+            shape=(n_frames, self.n_particles, 3),
+        )
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+def record_trajectory(particle_manager, filename, steps, record_every=1, conds=None):
+    """Run the simulation headless, appending a frame every `record_every` steps."""
+    if record_every < 1:
+        raise ValueError(f"record_every must be at least 1, got {record_every}")
+    with TrajectoryWriter(
+        filename,
+        len(particle_manager.particle_pos),
+        conds=conds,
+        dtype=particle_manager.particle_pos.dtype,
+        record_every=record_every,
+    ) as writer:
+        writer.append(particle_manager.particle_pos)
+        for _, positions in particle_manager.stream(steps, record_every):
+            writer.append(positions)
+    return TrajectoryReader(filename)
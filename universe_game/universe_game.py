@@ -6,4 +6,4 @@ class UniverseGame:
         self.gc = GameController(**kwargs)
 
     def start(self, mode="pygame", **kwargs):
-        self.gc.start(mode, **kwargs)
+        return self.gc.start(mode, **kwargs)